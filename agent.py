@@ -1,26 +1,22 @@
-from typing import List
-from langchain.agents import AgentType, ConversationalAgent
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional
+from langchain.agents import AgentType
 from langchain.agents import initialize_agent # type: ignore
 from langchain.agents.agent_types import AgentType
 from langchain.tools import BaseTool
-from langchain.memory import ConversationBufferMemory
-from langchain_openai import ChatOpenAI # type: ignore
-
-
-from tools.fallback import FallbackTool
-from tools.python_REPL import PythonREPLTool
+from langchain_core.language_models import BaseLLM
+from langchain.memory.chat_memory import BaseChatMemory
 
 """ Tool Imports"""
-from tools.guarded_retriever import GuardedRetrieverTool
+# Tool modules (and Chroma, torch, search clients behind them) are imported by the
+# registry on first use, not here.
 from tools.reasoning import ReasoningTool
-from tools.retriever import RetrieverTool
-from tools.websearch import WebSearchTool
-from tools.calculator import CalculatorTool
-from tools.longterm_memory import LongTermMemoryTool
-from longterm_memory import LongTermMemory
+from tools.registry import LazyTool, SharedResources, lazy_tools
+from conversation_memory import ContextWindowMemory, llm_summarizer
+from tracing import get_tracing_handler
 
-# from transformers import pipeline
-from langchain_ollama import OllamaLLM
+if TYPE_CHECKING:
+    from longterm_memory import LongTermMemory
 
 import warnings
 from langchain_core._api.deprecation import LangChainDeprecationWarning
@@ -30,71 +26,155 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-def load_llm():
-    return OllamaLLM(model="mistral", temperature=0.3)
-    # return ChatOpenAI(model="gpt-3.5-turbo", temperature=0.3)
+PROMPT_LAYOUTS = ("stable", "history-first")
+
+FORMAT_INSTRUCTIONS = (
+    "To use a tool, use the following format:\n\n"
+    "Thought: Do I need to use a tool? Yes\n"
+    "Action: The action to take, must be one of [{tool_names}]\n"
+    "Action Input: The input to the action\n\n"
+    "When you have the final answer, use:\n\n"
+    "Thought: Do I need to use a tool? No\n"
+    "Final Answer: [your answer here]"
+)
+
+
+def prompt_layout_from_env() -> str:
+    layout = os.getenv("CORTEX_PROMPT_LAYOUT", "stable")
+    if layout not in PROMPT_LAYOUTS:
+        raise ValueError(f"CORTEX_PROMPT_LAYOUT must be one of {PROMPT_LAYOUTS}, got {layout!r}")
+    return layout
+
+
+def prompt_parts(layout: str = "stable") -> Dict[str, str]:
+    """
+    The prefix and suffix around the tool list and format instructions.
+
+    "stable" keeps everything before the chat history fixed: system text, tools and
+    format instructions render to the same bytes on every turn and in every session,
+    so Ollama can reuse their evaluated context and only evaluates the history, the new
+    input and the scratchpad. "history-first" is the original layout, with the history
+    at the top.
+    """
+    if layout == "stable":
+        return {
+            "prefix": (
+                "You are a helpful assistant who can use tools. "
+                "Use the conversation so far to understand what the user has previously told you.\n\n"
+                "Tools:"
+            ),
+            "suffix": "Conversation so far:\n{chat_history}\n\nHuman: {input}\n{agent_scratchpad}",
+        }
+    if layout == "history-first":
+        return {
+            "prefix": (
+                "You are a helpful assistant who can use tools. "
+                "Below is the conversation so far:\n\n"
+                "{chat_history}\n\n"
+                "Use this to understand what the user has previously told you."
+            ),
+            "suffix": "Human: {input}\n{agent_scratchpad}",
+        }
+    raise ValueError(f"Unknown prompt layout {layout!r}; expected one of {PROMPT_LAYOUTS}")
+
+
+def load_llm(cache: Optional[bool] = None):
+    """
+    Returns the Ollama LLM, fronted by the persistent response cache unless `cache` is
+    False or CORTEX_LLM_CACHE=0.
+
+    The model is kept loaded for CORTEX_OLLAMA_KEEP_ALIVE (default 30m) and run with a
+    fixed context of CORTEX_OLLAMA_NUM_CTX tokens (default 4096): unloading the model or
+    changing its context size discards Ollama's cached prompt prefix, and a prompt
+    truncated to fit a small context no longer starts with that prefix.
+    """
+    from langchain_ollama import OllamaLLM
+    from llm_cache import get_llm_cache
+
+    if cache is None:
+        cache = os.getenv("CORTEX_LLM_CACHE", "1") != "0"
+    return OllamaLLM(
+        model="mistral",
+        temperature=0.3,
+        keep_alive=os.getenv("CORTEX_OLLAMA_KEEP_ALIVE", "30m"),
+        num_ctx=int(os.getenv("CORTEX_OLLAMA_NUM_CTX", "4096")),
+        cache=get_llm_cache() if cache else False,
+    )
 
-def get_tools(memory: ConversationBufferMemory) -> List[BaseTool]:
-    retriever = RetrieverTool()
-    guarded_retriever_tool = GuardedRetrieverTool(retriever=retriever)
-    websearch_tool = WebSearchTool()
-    calculator_tool = CalculatorTool()
-    fallback_tool = FallbackTool()
-    longterm_store = LongTermMemory()
-    longterm_tool = LongTermMemoryTool(memory_store=longterm_store)
+def get_shared_tools(longterm_store: Optional["LongTermMemory"] = None, lazy: bool = True) -> List[BaseTool]:
+    """
+    Builds the tools that hold no per-conversation state. These own the vector stores
+    and can be shared by every session in a process.
+
+    With `lazy` (the default) each tool is a LazyTool: its name, description and input
+    schema are available for the prompt immediately, and its stores, models and worker
+    processes are only loaded on first invocation. `lazy=False` builds every tool up front.
+    """
+    tools = lazy_tools(SharedResources(longterm_store))
+    if not lazy:
+        for tool in tools:
+            if isinstance(tool, LazyTool):
+                tool.resolve()
+    return tools
+
+def get_tools(
+    memory: BaseChatMemory,
+    shared_tools: Optional[List[BaseTool]] = None,
+) -> List[BaseTool]:
+    tools = list(shared_tools if shared_tools is not None else get_shared_tools())
     reasoning_tool = ReasoningTool(name="Reasoning", memory=memory)
-    python_repl_tool = PythonREPLTool()
-
-    return [
-        websearch_tool,
-        python_repl_tool,
-        calculator_tool,
-        guarded_retriever_tool,
-        longterm_tool,
-        reasoning_tool,
-        fallback_tool,
-    ]
+    # Fallback stays last in the prompt's tool list.
+    tools.insert(len(tools) - 1, reasoning_tool)
+    return tools
 
 
 # Initialize the LLM and tools
-def get_agent():
-    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-    tools = get_tools(memory)
-    llm = load_llm()
-
-    format_instructions = (
-        "To use a tool, use the following format:\n\n"
-        "Thought: Do I need to use a tool? Yes\n"
-        "Action: The action to take, must be one of [{tool_names}]\n"
-        "Action Input: The input to the action\n\n"
-        "When you have the final answer, use:\n\n"
-        "Thought: Do I need to use a tool? No\n"
-        "Final Answer: [your answer here]"
-    )
-
-    agent_prompt = ConversationalAgent.create_prompt(
-        tools=tools,
-        prefix=(
-            "You are a helpful assistant who can use tools. "
-            "Below is the conversation so far:\n\n"
-            "{chat_history}\n\n"
-            "Use this to understand what the user has previously told you."
-        ),
-        format_instructions=format_instructions,
-        suffix="{input}",
-        input_variables=["input", "chat_history", "agent_scratchpad"]
-    )
-
+def get_agent(
+    memory: Optional[BaseChatMemory] = None,
+    shared_tools: Optional[List[BaseTool]] = None,
+    llm: Optional[BaseLLM] = None,
+    prompt_layout: Optional[str] = None,
+):
+    """
+    Builds a conversational agent. Pass `shared_tools` and `llm` to reuse already-loaded
+    stores and models across sessions; each call gets its own memory unless one is given.
+    The default memory renders a token-budgeted history window with older turns
+    summarized in the background. `prompt_layout` (default CORTEX_PROMPT_LAYOUT, else
+    "stable") is one of PROMPT_LAYOUTS; see `prompt_parts`.
+    """
+    llm = llm or load_llm()
+    memory = memory or ContextWindowMemory(summarizer=llm_summarizer(llm))
+    tools = get_tools(memory, shared_tools)
+
+    # Constructor callbacks aren't inherited by child runs, so the tracing handler is
+    # attached to the LLM and each tool as well as the executor (idempotently, since the
+    # LLM and shared tools are reused across sessions).
+    tracing_handler = get_tracing_handler()
+    for component in [llm, *tools]:
+        callbacks = component.callbacks
+        if callbacks is None:
+            component.callbacks = [tracing_handler]
+        elif isinstance(callbacks, list) and tracing_handler not in callbacks:
+            callbacks.append(tracing_handler)
+
+    # The conversational agent renders "{prefix}\n\n{tools}\n\n{format_instructions}\n\n{suffix}";
+    # its output parser treats `ai_prefix` followed by a colon as the final answer.
     agent = initialize_agent(
         tools=tools,
         llm=llm,
-        agent_type=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
+        agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
         memory=memory,
-        agent_kwargs={"prompt": agent_prompt},
+        agent_kwargs={
+            **prompt_parts(prompt_layout or prompt_layout_from_env()),
+            "format_instructions": FORMAT_INSTRUCTIONS,
+            "ai_prefix": "Final Answer",
+            "input_variables": ["input", "chat_history", "agent_scratchpad"],
+        },
         verbose=False,
         handle_parsing_errors=True,
         max_iterations=3,
-        early_stopping_method="generate"
+        early_stopping_method="generate",
+        callbacks=[get_tracing_handler()],
     )
 
     return agent, memory
\ No newline at end of file
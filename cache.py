@@ -0,0 +1,194 @@
+# cache.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases and collapses whitespace so trivially different queries share a cache entry."""
+    return " ".join(query.split()).lower()
+
+
+class TTLCache(Generic[V]):
+    """
+    A thread-safe LRU cache whose entries also expire `ttl` seconds after being set.
+
+    `ttl=None` disables expiry. Hits, misses and evictions are counted and exposed via `stats()`.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if self.ttl is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else 0.0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_collection_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+
+def collection_version(name: str) -> int:
+    """Current version of a vector collection; part of every result-cache key for it."""
+    return _collection_versions.get(name, 0)
+
+
+def bump_collection_version(name: str) -> int:
+    """Marks a collection as changed so cached results for earlier versions are never served."""
+    with _versions_lock:
+        _collection_versions[name] = _collection_versions.get(name, 0) + 1
+        return _collection_versions[name]
+
+
+class PersistentTTLCache:
+    """
+    A small SQLite-backed key/value cache for JSON-serializable values that survives restarts.
+
+    Entries expire `ttl` seconds after being set; beyond `max_entries`, the entries closest
+    to expiry are dropped first.
+    """
+
+    def __init__(self, path: str, ttl: float = 900.0, max_entries: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl),
+            )
+            self._conn.execute("DELETE FROM kv WHERE expires_at < ?", (now,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM kv WHERE key IN (SELECT key FROM kv ORDER BY expires_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM kv")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        (size,) = self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+class _Call(Generic[V]):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[V] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[V]):
+    """
+    Coalesces concurrent calls for the same key: the first caller runs `fn`, and callers
+    that arrive while it is in flight wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call[V]] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], V]) -> V:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = _Call[V]()
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result  # type: ignore
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,141 @@
+# conversation_memory.py
+
+# pyright: reportUnknownMemberType=false
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, cast
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.schema import BaseMessage
+from langchain_core.language_models import BaseLLM
+from pydantic import PrivateAttr
+
+from data.chunking import approx_tokens
+
+# (existing summary, newly evicted lines) -> updated summary
+Summarizer = Callable[[str, str], str]
+
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+
+def format_message(msg: BaseMessage) -> str:
+    role = "Human" if msg.type == "human" else "AI"
+    content = msg.content if isinstance(msg.content, str) else str(cast(List[Any], msg.content))
+    return f"{role}: {content}"
+
+
+def llm_summarizer(llm: BaseLLM, max_words: int = 120) -> Summarizer:
+    def summarize(summary: str, new_lines: str) -> str:
+        prompt = (
+            "Progressively summarize the conversation, keeping facts the user stated "
+            f"about themselves. Use at most {max_words} words.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            f"New lines of conversation:\n{new_lines}\n\n"
+            "New summary:"
+        )
+        return str(llm.invoke(prompt)).strip()
+    return summarize
+
+
+class ContextWindowMemory(BaseChatMemory):
+    """
+    Chat memory that renders a bounded, incrementally maintained history for the prompt.
+
+    Only messages added since the last render are formatted. The rendered window keeps the
+    most recent lines that fit in `token_budget`; older lines are evicted and, if a
+    `summarizer` is set, folded into a running summary on a background thread so the
+    request path never waits on it. Prompt size therefore stays flat over long sessions.
+
+    The full message list is still available on `chat_memory.messages`.
+    """
+
+    memory_key: str = "chat_history"
+    token_budget: int = 1024
+    summary_budget: int = 256
+    summarizer: Optional[Summarizer] = None
+    count_tokens: Callable[[str], int] = approx_tokens
+
+    _lines: Deque[Tuple[str, int]] = PrivateAttr(default_factory=deque[Tuple[str, int]])
+    _window_tokens: int = PrivateAttr(default=0)
+    _synced: int = PrivateAttr(default=0)
+    _summary: str = PrivateAttr(default="")
+    _evicted: List[str] = PrivateAttr(default_factory=list)
+    _summarizing: bool = PrivateAttr(default=False)
+    _rendered: Optional[str] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {self.memory_key: self.render()}
+
+    def render(self) -> str:
+        with self._lock:
+            self._sync()
+            if self._rendered is None:
+                window = "\n".join(line for line, _ in self._lines)
+                self._rendered = (
+                    f"Summary of earlier conversation: {self._summary}\n{window}"
+                    if self._summary else window
+                )
+            return self._rendered
+
+    def clear(self) -> None:
+        super().clear()
+        with self._lock:
+            self._lines.clear()
+            self._window_tokens = 0
+            self._synced = 0
+            self._summary = ""
+            self._evicted.clear()
+            self._rendered = None
+
+    def _sync(self) -> None:
+        messages = self.chat_memory.messages
+        if len(messages) < self._synced:  # history was replaced underneath us
+            self._lines.clear()
+            self._window_tokens = 0
+            self._synced = 0
+        if self._synced == len(messages):
+            return
+
+        for msg in messages[self._synced:]:
+            line = format_message(msg)
+            tokens = self.count_tokens(line)
+            self._lines.append((line, tokens))
+            self._window_tokens += tokens
+        self._synced = len(messages)
+
+        while self._window_tokens > self.token_budget and len(self._lines) > 1:
+            line, tokens = self._lines.popleft()
+            self._window_tokens -= tokens
+            if self.summarizer is not None:
+                self._evicted.append(line)
+        self._rendered = None
+        self._schedule_summary()
+
+    def _schedule_summary(self) -> None:
+        if self.summarizer is None or self._summarizing or not self._evicted:
+            return
+        batch = "\n".join(self._evicted)
+        self._evicted.clear()
+        self._summarizing = True
+        _summary_executor.submit(self._summarize, self.summarizer, self._summary, batch)
+
+    def _summarize(self, summarizer: Summarizer, summary: str, batch: str) -> None:
+        try:
+            new_summary = summarizer(summary, batch)
+        except Exception:
+            new_summary = summary
+        words = new_summary.split()
+        while words and self.count_tokens(" ".join(words)) > self.summary_budget:
+            words = words[: len(words) * 3 // 4]
+        with self._lock:
+            self._summary = " ".join(words)
+            self._summarizing = False
+            self._rendered = None
+            self._schedule_summary()
@@ -0,0 +1,47 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain.docstore.document import Document
+
+
+def vector_backend() -> str:
+    """The configured vector store backend: "chroma" (default) or "numpy" (CORTEX_VECTOR_BACKEND)."""
+    backend = os.getenv("CORTEX_VECTOR_BACKEND", "chroma").lower()
+    if backend not in ("chroma", "numpy"):
+        raise ValueError(f"Unknown vector backend {backend!r}; expected 'chroma' or 'numpy'.")
+    return backend
+
+
+def vector_dtype() -> str:
+    """Storage dtype for the numpy backend: "float32" (default) or "float16" (CORTEX_VECTOR_DTYPE)."""
+    return os.getenv("CORTEX_VECTOR_DTYPE", "float32")
+
+
+def batch_similarity_search(
+    vstore: Any,
+    embeddings: Sequence[Sequence[float]],
+    k: int = 4,
+    filter: Optional[Dict[str, Any]] = None,
+) -> List[List[Document]]:
+    """
+    Top-k documents for several query embeddings with one store round trip: a single
+    matrix product on the numpy backend, a single `collection.query` on Chroma.
+    """
+    if not embeddings:
+        return []
+    if hasattr(vstore, "similarity_search_by_vectors"):
+        return vstore.similarity_search_by_vectors(embeddings, k=k, filter=filter)
+    kwargs: Dict[str, Any] = {"where": filter} if filter else {}
+    result = vstore._collection.query(
+        query_embeddings=[list(e) for e in embeddings],
+        n_results=k,
+        include=["documents", "metadatas"],
+        **kwargs,
+    )
+    return [
+        [
+            Document(page_content=text or "", metadata=dict(meta or {}), id=doc_id)
+            for doc_id, text, meta in zip(ids, texts or [], metas or [])
+        ]
+        for ids, texts, metas in zip(result["ids"], result["documents"] or [], result["metadatas"] or [])
+    ]
@@ -0,0 +1,47 @@
+from typing import Any, Iterator, NamedTuple
+
+
+def approx_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used when no tokenizer is given."""
+    return len(text) // 4 + 1
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+
+
+def chunk_text(
+    text: str,
+    tokenizer: Any,
+    max_tokens: int = 256,
+    overlap: int = 32,
+) -> Iterator[Chunk]:
+    """
+    Splits `text` into windows that fit the embedding model's sequence length.
+
+    Windows are measured in tokenizer tokens (leaving room for the special tokens the
+    model adds) and consecutive windows share `overlap` tokens. Each chunk carries the
+    character offsets of its span in `text`, so it can be traced back to the source.
+    """
+    budget = max_tokens - tokenizer.num_special_tokens_to_add()
+    if overlap >= budget:
+        raise ValueError("overlap must be smaller than the per-chunk token budget.")
+
+    offsets = tokenizer(
+        text,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        verbose=False,
+    )["offset_mapping"]
+    if not offsets:
+        return
+
+    step = budget - overlap
+    for first in range(0, len(offsets), step):
+        window = offsets[first:first + budget]
+        start, end = window[0][0], window[-1][1]
+        yield Chunk(text[start:end], start, end)
+        if first + budget >= len(offsets):
+            break
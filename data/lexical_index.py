@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+LEXICAL_INDEX_NAME = "lexical_index.sqlite3"
+LEGACY_LEXICAL_INDEX_NAME = "lexical_index.json"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL, text TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS postings ("
+    " term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id)",
+)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS: Set[str] = {
+    "a", "an", "and", "are", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "me", "of", "on", "or", "the", "there", "this", "to", "was",
+    "what", "when", "where", "which", "who", "will", "with", "you",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    An inverted index over the same chunks as the vector store, scored with BM25.
+
+    Postings (term, chunk id, term frequency), chunk lengths and chunk texts live in a
+    SQLite file next to the vector store. Opening the index reads nothing up front, a
+    search only reads the postings of its own terms, and a lexical hit's text is fetched
+    by id without touching Chroma. A new index is built in memory and written out by
+    `save`; a loaded one is updated in place, and `save` commits its changes.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        stored = {key: value for key, value in self._conn.execute("SELECT key, value FROM settings")}
+        self.k1 = float(stored.get("k1", k1))
+        self.b = float(stored.get("b", b))
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
+            [("k1", self.k1), ("b", self.b), ("documents", 0), ("total_length", 0)],
+        )
+        self._conn.commit()
+
+    def _totals(self) -> Tuple[int, int]:
+        stored = {key: value for key, value in self._conn.execute("SELECT key, value FROM settings")}
+        return int(stored["documents"]), int(stored["total_length"])
+
+    def _add_to_totals(self, documents: int, length: int) -> None:
+        self._conn.executemany(
+            "UPDATE settings SET value = value + ? WHERE key = ?",
+            [(documents, "documents"), (length, "total_length")],
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._totals()[0]
+
+    def add(self, doc_id: str, text: str) -> None:
+        tokens = tokenize(text)
+        with self._lock:
+            self._remove(doc_id)
+            self._conn.execute("INSERT INTO docs (doc_id, length, text) VALUES (?, ?, ?)", (doc_id, len(tokens), text))
+            self._conn.executemany(
+                "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                [(term, doc_id, tf) for term, tf in Counter(tokens).items()],
+            )
+            self._add_to_totals(1, len(tokens))
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        row = self._conn.execute("SELECT length FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return
+        self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+        self._add_to_totals(-1, -int(row[0]))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.executemany("UPDATE settings SET value = 0 WHERE key = ?", [("documents",), ("total_length",)])
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float, float]]:
+        """
+        Returns up to k (chunk id, BM25 score, coverage) triples, best first, where coverage
+        is the fraction of the query's distinct terms that occur in the chunk.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n, total_length = self._totals()
+            if not n:
+                return []
+            avg_len = total_length / n
+            scores: Dict[str, float] = {}
+            matched: Dict[str, int] = {}
+            for term in terms:
+                postings = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.doc_id = p.doc_id"
+                    " WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf, length in postings:
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[doc_id] = matched.get(doc_id, 0) + 1
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(doc_id, score, matched[doc_id] / len(terms)) for doc_id, score in ranked]
+
+    def get_texts(self, doc_ids: List[str]) -> List[str]:
+        """The texts of `doc_ids`, in order (empty for an unknown id)."""
+        if not doc_ids:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT doc_id, text FROM docs WHERE doc_id IN ({', '.join('?' * len(doc_ids))})", doc_ids
+            ).fetchall()
+        texts: Dict[str, str] = {doc_id: text for doc_id, text in rows}
+        return [texts.get(doc_id, "") for doc_id in doc_ids]
+
+    def save(self, persist_directory: str) -> None:
+        os.makedirs(persist_directory, exist_ok=True)
+        path = os.path.join(persist_directory, LEXICAL_INDEX_NAME)
+        with self._lock:
+            self._conn.commit()
+            if self.path != ":memory:" and os.path.abspath(self.path) == os.path.abspath(path):
+                return
+            target = sqlite3.connect(path)
+            try:
+                self._conn.backup(target)  # replaces the file's contents in one transaction
+            finally:
+                target.close()
+
+    @classmethod
+    def load(cls, persist_directory: str) -> Optional["LexicalIndex"]:
+        """Opens the index in `persist_directory`, converting a JSON index from older versions first."""
+        path = os.path.join(persist_directory, LEXICAL_INDEX_NAME)
+        if os.path.exists(path):
+            return cls(path=path)
+        legacy_path = os.path.join(persist_directory, LEGACY_LEXICAL_INDEX_NAME)
+        if not os.path.exists(legacy_path):
+            return None
+        with open(legacy_path, "r") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"], path=path)
+        for doc_id, text in data["texts"].items():
+            index.add(doc_id, text)
+        index.save(persist_directory)
+        os.remove(legacy_path)
+        return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Merges several best-first rankings of keys; each key scores sum(1 / (k + rank))."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda key: scores[key], reverse=True)
@@ -1,15 +1,293 @@
-from tools.retriever import RetrieverTool
+# pyright: reportUnknownMemberType=false
+
+import argparse
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from cache import bump_collection_version
+from data.chunking import chunk_text
+from data.lexical_index import LexicalIndex
+from data.backend import vector_backend, vector_dtype
+from models.embedding_model import DEFAULT_MODEL_NAME, backend_from_env, get_embedding_model, load_backend
+
+MANIFEST_NAME = "ingest_manifest.json"
+COLLECTION_NAME = "langchain"  # the default collection langchain_chroma reads from
+
+
+def iter_text_files(folder: str = "data/documents") -> Iterator[str]:
+    """Yields the path of every regular file in `folder`, in a stable order."""
+    for file in sorted(os.listdir(folder)):
+        path = os.path.join(folder, file)
+        if os.path.isfile(path):
+            yield path
 
-from typing import List
 
 def load_text_files(folder: str = "data/documents") -> List[str]:
     texts: List[str] = []
-    for file in os.listdir(folder):
-        path = os.path.join(folder, file)
+    for path in iter_text_files(folder):
         with open(path, "r") as f:
             texts.append(f.read())
     return texts
 
-texts = load_text_files()
-RetrieverTool.build_from_documents(texts)
+
+def manifest_key(path: str) -> str:
+    """Files are tracked by real path, so a folder given relatively or absolutely maps to the same entries."""
+    return os.path.realpath(path)
+
+
+def load_manifest(persist_directory: str) -> Dict[str, Dict[str, Any]]:
+    path = os.path.join(persist_directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        manifest: Dict[str, Dict[str, Any]] = json.load(f)
+    # Older manifests were keyed by the path as given (relative to the working directory).
+    return {manifest_key(key): entry for key, entry in manifest.items()}
+
+
+def save_manifest(persist_directory: str, manifest: Dict[str, Dict[str, Any]]) -> None:
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+_worker_model: Any = None
+
+
+def _init_worker(model_name: str, backend: str, threads: int) -> None:
+    global _worker_model
+    _worker_model = load_backend(backend, model_name, threads=threads)
+
+
+def _embed_shard(texts: List[str]) -> List[List[float]]:
+    return _worker_model.encode(texts)
+
+
+class BulkEmbedder:
+    """
+    Embeds large batches of chunks, either in-process through the shared EmbeddingModel
+    (`workers=1`) or sharded across a pool of worker processes, each holding its own
+    model copy (on the configured embedding backend) and a slice of the CPU's threads.
+    """
+
+    def __init__(self, workers: int = 1, model_name: str = DEFAULT_MODEL_NAME, backend: Optional[str] = None):
+        self.workers = max(1, workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if self.workers > 1:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(model_name, backend or backend_from_env(), threads),
+            )
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if self._pool is None:
+            return get_embedding_model().embed(texts)
+        shard_size = max(1, -(-len(texts) // self.workers))
+        shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+        vectors: List[List[float]] = []
+        for shard_vectors in self._pool.map(_embed_shard, shards):
+            vectors.extend(shard_vectors)
+        return vectors
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def ingest_documents(
+    folder: str = "data/documents",
+    persist_directory: str = "vectorstore",
+    batch_size: int = 512,
+    workers: int = 1,
+    max_tokens: int = 256,
+    overlap: int = 32,
+) -> Dict[str, float]:
+    """
+    Incrementally syncs the Chroma store in `persist_directory` with the files in `folder`.
+
+    A manifest of real path -> (size, mtime, sha256, chunking settings, vector ids) is
+    kept next to the index. Files whose size and mtime are unchanged are skipped without
+    being read; files whose content hash is unchanged are skipped without being embedded.
+    Changed files, and files chunked with different `max_tokens`/`overlap` or another
+    embedding model, have their old vectors replaced; files that disappeared have their
+    vectors deleted.
+
+    New and changed files are streamed one at a time, split into token-bounded overlapping
+    chunks (with source and character offsets in their metadata), embedded `batch_size`
+    chunks at a time by a BulkEmbedder with `workers` processes, and written to Chroma in
+    batched upserts. The BM25 lexical index next to the store is kept in sync with the
+    same chunk ids, and so is the memory-mapped numpy export when CORTEX_VECTOR_BACKEND
+    is "numpy" (it is rewritten from Chroma's stored embeddings, not re-embedded).
+
+    A store built before the manifest existed is cleared once and rebuilt, since its
+    vectors cannot be mapped back to files.
+
+    Returns:
+        Dict[str, float]: counts of added, updated, removed and unchanged files, chunks
+        embedded, elapsed seconds and chunks/sec throughput.
+    """
+    import chromadb
+
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=persist_directory)
+    collection = client.get_or_create_collection(COLLECTION_NAME)
+    max_write = client.get_max_batch_size()
+    tokenizer = get_embedding_model().tokenizer
+    chunking = {"max_tokens": max_tokens, "overlap": overlap, "model": get_embedding_model().model_name}
+    embedder = BulkEmbedder(workers=workers)
+
+    manifest = load_manifest(persist_directory)
+    loaded = LexicalIndex.load(persist_directory) if manifest else None
+    lexical = loaded or LexicalIndex()
+    if not manifest:
+        legacy_ids = collection.get(include=[])["ids"]
+        for i in range(0, len(legacy_ids), max_write):
+            collection.delete(ids=legacy_ids[i:i + max_write])
+    elif loaded is None:
+        # Store indexed before the lexical index existed: build it from the stored chunks.
+        existing = collection.get(include=["documents"])
+        for chunk_id, text in zip(existing["ids"], existing["documents"] or []):
+            lexical.add(chunk_id, text)
+
+    stats: Dict[str, float] = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "chunks": 0}
+    new_manifest: Dict[str, Dict[str, Any]] = {}
+    stale_ids: List[str] = []
+    pending_ids: List[str] = []
+    pending_texts: List[str] = []
+    pending_meta: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        for i in range(0, len(stale_ids), max_write):
+            collection.delete(ids=stale_ids[i:i + max_write])
+        for chunk_id in stale_ids:
+            lexical.remove(chunk_id)
+        stale_ids.clear()
+        if not pending_texts:
+            return
+        vectors = embedder.embed(pending_texts)
+        for i in range(0, len(pending_ids), max_write):
+            collection.upsert(
+                ids=pending_ids[i:i + max_write],
+                embeddings=vectors[i:i + max_write],  # type: ignore
+                documents=pending_texts[i:i + max_write],
+                metadatas=pending_meta[i:i + max_write],  # type: ignore
+            )
+        for chunk_id, text in zip(pending_ids, pending_texts):
+            lexical.add(chunk_id, text)
+        stats["chunks"] += len(pending_texts)
+        pending_ids.clear()
+        pending_texts.clear()
+        pending_meta.clear()
+
+    try:
+        for path in iter_text_files(folder):
+            key = manifest_key(path)
+            st = os.stat(path)
+            previous = manifest.get(key)
+            same_chunking = previous is not None and previous.get("chunking") == chunking
+            if previous and same_chunking and previous["size"] == st.st_size and previous["mtime"] == st.st_mtime:
+                new_manifest[key] = previous
+                stats["unchanged"] += 1
+                continue
+
+            with open(path, "rb") as f:
+                raw = f.read()
+            content_hash = hashlib.sha256(raw).hexdigest()
+            if previous and same_chunking and previous["hash"] == content_hash:
+                new_manifest[key] = {**previous, "size": st.st_size, "mtime": st.st_mtime}
+                stats["unchanged"] += 1
+                continue
+
+            if previous:
+                stale_ids.extend(previous["ids"])
+                stats["updated"] += 1
+            else:
+                stats["added"] += 1
+
+            ids: List[str] = []
+            chunks = chunk_text(raw.decode("utf-8"), tokenizer, max_tokens=max_tokens, overlap=overlap)
+            for index, chunk in enumerate(chunks):
+                chunk_id = f"{key}#{content_hash[:16]}:{index}"
+                ids.append(chunk_id)
+                pending_ids.append(chunk_id)
+                pending_texts.append(chunk.text)
+                pending_meta.append({
+                    "source": path,
+                    "content_hash": content_hash,
+                    "chunk": index,
+                    "start": chunk.start,
+                    "end": chunk.end,
+                })
+                if len(pending_texts) >= batch_size:
+                    flush()
+
+            new_manifest[key] = {
+                "size": st.st_size,
+                "mtime": st.st_mtime,
+                "hash": content_hash,
+                "chunking": chunking,
+                "ids": ids,
+            }
+
+        for key, entry in manifest.items():
+            if key not in new_manifest:
+                stale_ids.extend(entry["ids"])
+                stats["removed"] += 1
+
+        flush()
+    finally:
+        embedder.close()
+
+    lexical.save(persist_directory)
+    save_manifest(persist_directory, new_manifest)
+    changed = bool(stats["added"] or stats["updated"] or stats["removed"])
+    if vector_backend() == "numpy":
+        from data.numpy_store import META_NAME, NumpyVectorStore
+
+        if changed or not os.path.exists(os.path.join(persist_directory, META_NAME)):
+            NumpyVectorStore.from_chroma(persist_directory, get_embedding_model(), COLLECTION_NAME, dtype=vector_dtype())
+    if changed:
+        bump_collection_version(persist_directory)
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed"] = elapsed
+    stats["chunks_per_sec"] = stats["chunks"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Vector store `{persist_directory}` synced: "
+        f"{stats['added']:.0f} added, {stats['updated']:.0f} updated, "
+        f"{stats['removed']:.0f} removed, {stats['unchanged']:.0f} unchanged."
+    )
+    print(
+        f"Embedded {stats['chunks']:.0f} chunks in {elapsed:.2f}s "
+        f"({stats['chunks_per_sec']:.1f} docs/sec, {workers} worker(s))."
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally index documents into the vector store.")
+    parser.add_argument("--folder", default="data/documents")
+    parser.add_argument("--persist-directory", default="vectorstore")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding processes (1 = in-process).")
+    parser.add_argument("--batch-size", type=int, default=512, help="Chunks embedded per batch.")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--overlap", type=int, default=32)
+    args = parser.parse_args()
+    ingest_documents(
+        folder=args.folder,
+        persist_directory=args.persist_directory,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        max_tokens=args.max_tokens,
+        overlap=args.overlap,
+    )
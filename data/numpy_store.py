@@ -0,0 +1,509 @@
+# pyright: reportUnknownMemberType=false
+
+import fcntl
+import json
+import operator
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Sequence, Tuple, cast
+
+import numpy as np
+import numpy.typing as npt
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+
+VECTORS_NAME = "vectors.npy"
+META_NAME = "vectors_meta.json"
+LOG_NAME = "vectors_log.jsonl"
+LOG_VECTORS_NAME = "vectors_log.f32"
+LOCK_NAME = "vectors.lock"
+
+SCORE_BLOCK_ROWS = 8192
+COMPACT_MIN_ENTRIES = 1024  # log entries tolerated before compacting, however small the store
+
+
+_RANGE_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
+
+def _matches(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Evaluates the subset of Chroma `where` filters we use: equality, $eq, $ne, $in, range operators and $and."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            condition = cast(Dict[str, Any], condition)
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            for op, compare in _RANGE_OPS.items():
+                if op in condition and (value is None or not compare(value, condition[op])):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _Snapshot:
+    """
+    One consistent view of the store. Snapshots are never mutated: a refresh builds a new
+    one and swaps it in, so a search that took a snapshot reads ids, rows and vectors
+    from the same version even if another thread refreshes meanwhile.
+
+    Rows number the exported matrix first and the append log after it. Rows whose id was
+    upserted again or deleted later are dead: they stay in the lists but are no longer
+    reachable through `row_of`, `live_rows` or the index.
+    """
+
+    def __init__(
+        self,
+        stamp: Any,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        segments: List[Tuple[int, Any]],
+        row_of: Dict[str, int],
+        index_keys: Sequence[str],
+        log_bytes: int = 0,
+        log_rows: int = 0,
+        log_entries: int = 0,
+    ):
+        self.stamp = stamp
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.segments = segments  # (first row, matrix) for the export and the log
+        self.row_of = row_of
+        self.dim = int(segments[0][1].shape[1]) if segments else 0
+        self.log_bytes = log_bytes
+        self.log_rows = log_rows
+        self.log_entries = log_entries  # rows appended plus ids deleted since the last compaction
+        self.live_rows: npt.NDArray[np.int64] = np.fromiter(sorted(row_of.values()), dtype=np.int64, count=len(row_of))
+        self.all_live = len(row_of) == len(ids)
+
+        index: Dict[str, Dict[Any, List[int]]] = {key: {} for key in index_keys}
+        for row in self.live_rows.tolist():
+            for key, rows_by_value in index.items():
+                rows_by_value.setdefault(metadatas[row].get(key), []).append(row)
+        self.index: Dict[str, Dict[Any, npt.NDArray[np.int64]]] = {
+            key: {value: np.asarray(rows, dtype=np.int64) for value, rows in rows_by_value.items()}
+            for key, rows_by_value in index.items()
+        }
+
+    def take(self, rows: npt.NDArray[np.int64]) -> npt.NDArray[np.float32]:
+        """The vectors of `rows` as one float32 matrix (copies only those rows)."""
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        for start, matrix in self.segments:
+            mask = (rows >= start) & (rows < start + len(matrix))
+            if mask.any():
+                out[mask] = matrix[rows[mask] - start]
+        return out
+
+    def score_all(self, queries: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        """Scores of every live row (columns follow `live_rows`), a block of rows at a time."""
+        scores = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+        for start, matrix in self.segments:
+            for offset in range(0, len(matrix), SCORE_BLOCK_ROWS):
+                # float16 has no BLAS matmul, so each block is upcast before the product
+                block = np.asarray(matrix[offset:offset + SCORE_BLOCK_ROWS], dtype=np.float32)
+                scores[:, start + offset:start + offset + len(block)] = queries @ block.T
+        return scores if self.all_live else scores[:, self.live_rows]
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _normalized(vectors: Any) -> npt.NDArray[np.float32]:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class NumpyVectorStore:
+    """
+    A vector store kept as one memory-mapped `.npy` matrix of L2-normalized embeddings
+    (float32, or float16 to halve the footprint) plus a JSON sidecar of ids, texts and
+    metadata.
+
+    Opening the store maps the file rather than reading it, so start-up is near-instant
+    and every process that opens the same file shares one physical copy through the OS
+    page cache. Search is an exact top-k, scored a block of rows at a time in float32.
+
+    Metadata keys named in `index_keys` get an in-memory value -> rows index, so a
+    filtered search that pins one of them (e.g. one user's facts) only filters and scores
+    that subset instead of the whole matrix.
+
+    It implements the parts of the LangChain Chroma interface the tools use
+    (`similarity_search`, `add_documents`, `get`, `delete`, `delete_collection`).
+
+    Writes append to a log (float32 rows plus one JSON line per upsert or delete) instead
+    of rewriting the export, so saving a fact costs the size of the fact. Once the log
+    grows past half the store it is compacted into a new export. Several processes may
+    read and write the same directory: writers hold an exclusive `flock` on a lock file
+    while they append or compact, and readers a shared one while they reload, so nobody
+    sees or loses a half-applied write. Readers notice a changed export or log and reload
+    on their next call.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function: Embeddings,
+        dtype: str = "float32",
+        index_keys: Sequence[str] = (),
+    ):
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.dtype = np.dtype(dtype)
+        self.index_keys = tuple(index_keys)
+        self._base: Optional[Tuple[Any, List[str], List[str], List[Dict[str, Any]], Any]] = None
+        self._snapshot = _Snapshot((None, None), [], [], [], [], {}, self.index_keys)
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    @contextmanager
+    def _file_lock(self, operation: int) -> Generator[None, None, None]:
+        """Holds `flock(operation)` on the store's lock file, across processes."""
+        fd = os.open(self._path(LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            os.close(fd)  # closing releases the lock
+
+    def _stamp(self) -> Tuple[Any, Any]:
+        return _file_stamp(self._path(META_NAME)), _file_stamp(self._path(LOG_NAME))
+
+    def _refresh(self) -> _Snapshot:
+        snapshot = self._snapshot
+        if self._stamp() == snapshot.stamp:
+            return snapshot
+        if not os.path.isdir(self.persist_directory):
+            return self._reload()
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            return self._reload()
+
+    def _reload(self) -> _Snapshot:
+        """Rebuilds the snapshot from disk if it changed. Callers hold the file lock."""
+        stamp = self._stamp()
+        if stamp == self._snapshot.stamp:
+            return self._snapshot
+        base_stamp, log_stamp = stamp
+        if base_stamp is None:
+            self._base = None
+        elif self._base is None or self._base[0] != base_stamp:
+            with open(self._path(META_NAME), "r") as f:
+                meta = json.load(f)
+            matrix = np.load(self._path(VECTORS_NAME), mmap_mode="r") if meta["ids"] else None
+            self._base = (base_stamp, meta["ids"], meta["texts"], meta["metadatas"], matrix)
+
+        ids: List[str] = []
+        texts: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        segments: List[Tuple[int, Any]] = []
+        if self._base is not None:
+            _, base_ids, base_texts, base_metadatas, matrix = self._base
+            ids, texts, metadatas = list(base_ids), list(base_texts), list(base_metadatas)
+            if matrix is not None:
+                segments.append((0, matrix))
+        row_of = {doc_id: row for row, doc_id in enumerate(ids)}
+
+        log_bytes = log_rows = log_entries = dim = 0
+        if log_stamp is not None:
+            with open(self._path(LOG_NAME), "rb") as f:
+                lines = f.read().splitlines(keepends=True)
+            for line in lines:
+                if not line.endswith(b"\n"):
+                    break  # a writer died mid-line; the next writer truncates it
+                log_bytes += len(line)
+                record = json.loads(line)
+                if "delete" in record:
+                    for doc_id in record["delete"]:
+                        row_of.pop(doc_id, None)
+                    log_entries += len(record["delete"])
+                    continue
+                dim = record["dim"]
+                for doc_id, text, metadata in zip(record["ids"], record["texts"], record["metadatas"]):
+                    row_of[doc_id] = len(ids)
+                    ids.append(doc_id)
+                    texts.append(text)
+                    metadatas.append(metadata)
+                log_rows += len(record["ids"])
+            log_entries += log_rows
+            if log_rows:
+                log_vectors = np.memmap(self._path(LOG_VECTORS_NAME), dtype=np.float32, mode="r", shape=(log_rows, dim))
+                segments.append((len(ids) - log_rows, log_vectors))
+
+        self._snapshot = _Snapshot(
+            stamp, ids, texts, metadatas, segments, row_of, self.index_keys,
+            log_bytes=log_bytes, log_rows=log_rows, log_entries=log_entries,
+        )
+        return self._snapshot
+
+    def __len__(self) -> int:
+        return len(self._refresh().row_of)
+
+    # --- search -----------------------------------------------------------------
+
+    def _candidate_rows(self, snapshot: _Snapshot, where: Optional[Dict[str, Any]]) -> Optional[npt.NDArray[np.int64]]:
+        """Live rows matching `where` (None: every live row), narrowed first through an index when possible."""
+        if not where:
+            return None
+        candidates: Optional[npt.NDArray[np.int64]] = None
+        for clause in where.get("$and", [where]):
+            for key, condition in clause.items():
+                if key not in snapshot.index:
+                    continue
+                if isinstance(condition, dict):
+                    if "$eq" not in condition:
+                        continue
+                    condition = cast(Dict[str, Any], condition)["$eq"]
+                candidates = snapshot.index[key].get(condition, np.zeros(0, dtype=np.int64))
+                break
+            if candidates is not None:
+                break
+        rows = candidates if candidates is not None else snapshot.live_rows
+        metadatas = snapshot.metadatas
+        row_list: List[int] = rows.tolist()
+        return np.fromiter((i for i in row_list if _matches(metadatas[i], where)), dtype=np.int64)
+
+    def _search(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        k: int,
+        filter: Optional[Dict[str, Any]],
+    ) -> List[Tuple[_Snapshot, List[Tuple[int, float]]]]:
+        """The snapshot searched and its (row, cosine score) pairs, best first, for each query embedding."""
+        snapshot = self._refresh()
+        if not snapshot.row_of or not len(embeddings):
+            return [(snapshot, []) for _ in embeddings]
+        rows = self._candidate_rows(snapshot, filter)
+        if rows is not None and not len(rows):
+            return [(snapshot, []) for _ in embeddings]
+        queries = np.asarray(embeddings, dtype=np.float32)
+        queries /= np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+        if rows is None:
+            rows = snapshot.live_rows
+            scores = snapshot.score_all(queries)
+        else:
+            scores = queries @ snapshot.take(rows).T  # copies only the candidate rows
+
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results: List[Tuple[_Snapshot, List[Tuple[int, float]]]] = []
+        for row_scores, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-row_scores[candidates])]
+            results.append((snapshot, [(int(rows[j]), float(row_scores[j])) for j in ranked]))
+        return results
+
+    @staticmethod
+    def _document(snapshot: _Snapshot, row: int) -> Document:
+        return Document(page_content=snapshot.texts[row], metadata=snapshot.metadatas[row], id=snapshot.ids[row])
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Document, float]]:
+        snapshot, hits = self._search([embedding], k, filter)[0]
+        return [(self._document(snapshot, row), score) for row, score in hits]
+
+    def similarity_search_by_vectors(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Document]]:
+        """Top-k documents for each of several query embeddings, scored in one matrix product."""
+        return [
+            [self._document(snapshot, row) for row, _ in hits]
+            for snapshot, hits in self._search(embeddings, k, filter)
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self.embedding_function.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    # --- writes -----------------------------------------------------------------
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        return self.add_texts(
+            [doc.page_content for doc in documents],
+            metadatas=[{**doc.metadata} for doc in documents],
+            ids=ids,
+        )
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        start = len(self)
+        ids = ids or [str(start + i) for i in range(len(texts))]
+        metadatas = metadatas or [{} for _ in texts]
+        new_vectors = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        self.upsert_vectors(ids, texts, metadatas, new_vectors)
+        return ids
+
+    def upsert_vectors(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        vectors: Any,
+    ) -> None:
+        """Upserts precomputed embeddings (they are normalized here) by appending them to the log."""
+        if not ids:
+            return
+        normalized = _normalized(vectors)
+        record = {"ids": list(ids), "texts": list(texts), "metadatas": list(metadatas), "dim": int(normalized.shape[1])}
+        self._append(record, normalized)
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        snapshot = self._refresh()
+        candidates = self._candidate_rows(snapshot, where)
+        rows = candidates if candidates is not None else snapshot.live_rows
+        if ids is not None:
+            wanted = {snapshot.row_of[doc_id] for doc_id in ids if doc_id in snapshot.row_of}
+            rows = rows[np.isin(rows, np.fromiter(wanted, dtype=np.int64, count=len(wanted)))]
+        include = include if include is not None else ["documents", "metadatas"]
+        result: Dict[str, Any] = {"ids": [snapshot.ids[i] for i in rows.tolist()]}
+        result["documents"] = [snapshot.texts[i] for i in rows.tolist()] if "documents" in include else None
+        result["metadatas"] = [snapshot.metadatas[i] for i in rows.tolist()] if "metadatas" in include else None
+        result["embeddings"] = snapshot.take(rows) if "embeddings" in include and len(rows) else None
+        return result
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        if not ids:
+            return
+        self._append({"delete": list(ids)})
+
+    def delete_collection(self) -> None:
+        if not os.path.isdir(self.persist_directory):
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            for name in (META_NAME, VECTORS_NAME, LOG_NAME, LOG_VECTORS_NAME):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self._reload()
+
+    def _append(self, record: Dict[str, Any], vectors: Optional[npt.NDArray[np.float32]] = None) -> None:
+        """Appends one upsert or delete record to the log, compacting the log when it has grown too long."""
+        os.makedirs(self.persist_directory, exist_ok=True)
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            snapshot = self._reload()
+            if "delete" in record:
+                record["delete"] = [doc_id for doc_id in record["delete"] if doc_id in snapshot.row_of]
+                if not record["delete"]:
+                    return
+            elif snapshot.dim and record["dim"] != snapshot.dim:
+                raise ValueError(f"Expected {snapshot.dim}-dimensional vectors, got {record['dim']}")
+
+            if vectors is not None:
+                with open(self._path(LOG_VECTORS_NAME), "ab") as f:
+                    f.truncate(snapshot.log_rows * snapshot.dim * 4)  # drop rows of a write that died before its record
+                    f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self._path(LOG_NAME), "ab") as f:
+                f.truncate(snapshot.log_bytes)
+                f.write(json.dumps(record).encode("utf-8") + b"\n")
+
+            snapshot = self._reload()
+            if snapshot.log_entries > max(COMPACT_MIN_ENTRIES, len(snapshot.row_of) // 2):
+                self._compact(snapshot)
+
+    def compact(self) -> None:
+        """Folds the log into a new export now, instead of waiting for it to outgrow the store."""
+        if not os.path.isdir(self.persist_directory):
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            snapshot = self._reload()
+            if snapshot.log_entries:
+                self._compact(snapshot)
+
+    def _compact(self, snapshot: _Snapshot) -> None:
+        rows = snapshot.live_rows
+        row_list: List[int] = rows.tolist()
+        self._write(
+            [snapshot.ids[i] for i in row_list],
+            [snapshot.texts[i] for i in row_list],
+            [snapshot.metadatas[i] for i in row_list],
+            snapshot.take(rows),
+        )
+
+    def _write(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], vectors: Any) -> None:
+        """Replaces the export atomically, sidecar last, and empties the log. Callers hold the exclusive file lock."""
+        tmp_vectors = self._path(VECTORS_NAME) + ".tmp.npy"
+        np.save(tmp_vectors, np.ascontiguousarray(vectors, dtype=self.dtype))
+        os.replace(tmp_vectors, self._path(VECTORS_NAME))
+        tmp_meta = self._path(META_NAME) + ".tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump({"ids": ids, "texts": texts, "metadatas": metadatas}, f)
+        os.replace(tmp_meta, self._path(META_NAME))
+        for name in (LOG_NAME, LOG_VECTORS_NAME):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self._reload()
+
+    @classmethod
+    def from_chroma(
+        cls,
+        persist_directory: str,
+        embedding_function: Embeddings,
+        collection_name: str = "langchain",
+        dtype: str = "float32",
+    ) -> "NumpyVectorStore":
+        """Exports a Chroma collection (reusing its stored embeddings) into numpy files in the same directory."""
+        import chromadb
+
+        client = chromadb.PersistentClient(path=persist_directory)
+        data = client.get_collection(collection_name).get(include=["documents", "metadatas", "embeddings"])
+        store = cls(persist_directory, embedding_function, dtype=dtype)
+        with store._lock, store._file_lock(fcntl.LOCK_EX):
+            ids = list(data["ids"])
+            vectors = _normalized(data["embeddings"]) if ids else np.zeros((0, 0), np.float32)
+            store._write(
+                ids,
+                list(data["documents"] or []),
+                [dict(m or {}) for m in (data["metadatas"] or [])],
+                vectors,
+            )
+        return store
@@ -19,6 +19,8 @@ def spinner(message: str="Thinking"):
 
     def stop_spinner():
         nonlocal stop
+        if stop:
+            return  # already stopped, e.g. when the first streamed token arrived
         stop = True
         thread.join()
         sys.stdout.write('\r' + ' ' * 40 + '\r')  # Clear line
@@ -0,0 +1,85 @@
+import asyncio
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+# (event, data) pairs; `None` marks the end of the stream.
+StreamEvent = Optional[Tuple[str, str]]
+
+
+class QueueStreamHandler(AsyncCallbackHandler):
+    """
+    Pushes LLM tokens and tool activity onto an asyncio queue as they are generated,
+    so a consumer (e.g. an SSE response) can forward them without waiting for the
+    agent to finish.
+    """
+
+    def __init__(self):
+        self.queue: "asyncio.Queue[StreamEvent]" = asyncio.Queue()
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        await self.queue.put(("token", token))
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        await self.queue.put(("tool", f"{serialized.get('name', 'tool')}: {input_str}"))
+
+    async def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        await self.queue.put(("observation", str(output)))
+
+    async def close(self) -> None:
+        await self.queue.put(None)
+
+
+class ConsoleStreamHandler(AsyncCallbackHandler):
+    """
+    Streams the agent's progress to the terminal: each tool call is printed as it
+    starts, and the final answer is printed token by token once the LLM emits one of
+    `answer_markers`. `on_first_token` runs once, when the first LLM token arrives
+    (the CLI uses it to stop the spinner).
+    """
+
+    def __init__(
+        self,
+        on_first_token: Optional[Callable[[], None]] = None,
+        answer_markers: Tuple[str, ...] = ("Final Answer:", "AI:"),
+        prefix: str = "\n⚇ Cortex: ",
+    ):
+        self.on_first_token = on_first_token
+        self.answer_markers = answer_markers
+        self.prefix = prefix
+        self.answer_streamed = False
+        self._buffer = ""
+        self._in_answer = False
+
+    def _first_output(self) -> None:
+        if self.on_first_token is not None:
+            self.on_first_token()
+            self.on_first_token = None
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        self._buffer = ""
+        self._in_answer = False
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self._first_output()
+        if self._in_answer:
+            self._write(token)
+            return
+        self._buffer += token
+        for marker in self.answer_markers:
+            idx = self._buffer.find(marker)
+            if idx >= 0:
+                self._in_answer = True
+                self.answer_streamed = True
+                self._write(self.prefix + self._buffer[idx + len(marker):].lstrip())
+                return
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        self._first_output()
+        self._write(f"\n  ↳ {serialized.get('name', 'tool')}: {input_str}\n")
+
+    @staticmethod
+    def _write(text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
@@ -0,0 +1,260 @@
+# llm_cache.py
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.outputs import Generation
+
+from models.embedding_model import EmbeddingModel, get_embedding_model
+
+TOUCH_BATCH = 100  # cache hits whose last-access times are written in one commit
+
+_scope: ContextVar[Optional[str]] = ContextVar("llm_cache_scope", default=None)
+
+
+@contextmanager
+def cache_scope(user_id: str) -> Generator[None, None, None]:
+    """
+    Marks LLM calls made inside the block as made for `user_id`. The semantic tier only
+    reuses answers cached under the same scope, and is skipped for calls without one.
+    """
+    token = _scope.set(user_id)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def _key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    return struct.pack(f"{len(vector)}f", *vector)
+
+
+def _unpack(blob: bytes) -> List[float]:
+    return list(struct.unpack(f"{len(blob) // 4}f", blob))
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+class PersistentLLMCache(BaseCache):
+    """
+    SQLite-backed LLM response cache, used through LangChain's `cache=` hook on the LLM.
+
+    The exact tier keys on the rendered prompt plus the model's parameter string
+    (`llm_string`), so a change of model or temperature never reuses an answer. The optional
+    semantic tier reuses an answer for the same `llm_string` when the embedding of the
+    prompt's tail (the part that varies: question, history, scratchpad) has cosine
+    similarity of at least `semantic_threshold` with a cached one. Near-identical prompts
+    can still differ in whose conversation or facts they carry, so the semantic tier only
+    serves calls made inside a `cache_scope` and only from answers cached in the same one.
+
+    At most `max_entries` responses are kept; the least recently used are evicted. Hits
+    update their last-access time in batches of `TOUCH_BATCH` (or with the next update),
+    so recency from the last few hits before a crash may be lost.
+    Setting `bypass` makes every lookup miss and every update a no-op.
+    """
+
+    def __init__(
+        self,
+        path: str = "llm_cache/cache.sqlite3",
+        max_entries: int = 10_000,
+        semantic: bool = False,
+        semantic_threshold: float = 0.95,
+        semantic_chars: int = 1000,
+        embedding_model: Optional[EmbeddingModel] = None,
+        bypass: bool = False,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+        self.semantic_chars = semantic_chars
+        self.bypass = bypass
+        self._embedding_model = embedding_model
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # (llm_string, scope) -> [(key, unit vector)], loaded lazily for the semantic tier
+        self._vectors: Optional[Dict[Tuple[str, str], List[Tuple[str, List[float]]]]] = None
+        self._touched: Dict[str, float] = {}  # key -> last access, not yet written
+        self._unwritten_hits = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, llm_string TEXT NOT NULL, response TEXT NOT NULL,"
+            " embedding BLOB, last_access REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(llm_cache)")}
+        if "scope" not in columns:  # caches written before semantic entries were scoped
+            self._conn.execute("ALTER TABLE llm_cache ADD COLUMN scope TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_access ON llm_cache (last_access)")
+        self._conn.commit()
+
+    @property
+    def embedding_model(self) -> EmbeddingModel:
+        if self._embedding_model is None:
+            self._embedding_model = get_embedding_model()
+        return self._embedding_model
+
+    def _embed_tail(self, prompt: str) -> List[float]:
+        return _normalize(self.embedding_model.embed_query(prompt[-self.semantic_chars:]))
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if self.bypass:
+            return None
+        key = _key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._touch(key)
+                self.hits += 1
+                return [Generation(text=text) for text in json.loads(row[0])]
+
+        scope = _scope.get()
+        if self.semantic and scope is not None:
+            match = self._semantic_lookup(prompt, llm_string, scope)
+            if match is not None:
+                return match
+
+        self.misses += 1
+        return None
+
+    def _semantic_lookup(self, prompt: str, llm_string: str, scope: str) -> Optional[RETURN_VAL_TYPE]:
+        query = self._embed_tail(prompt)
+        with self._lock:
+            best_key, best_score = None, -1.0
+            for key, vector in self._load_vectors().get((llm_string, scope), []):
+                score = sum(a * b for a, b in zip(query, vector))
+                if score > best_score:
+                    best_key, best_score = key, score
+            if best_key is None or best_score < self.semantic_threshold:
+                return None
+            row = self._conn.execute("SELECT response FROM llm_cache WHERE key = ?", (best_key,)).fetchone()
+            if row is None:
+                return None
+            self._touch(best_key)
+            self.semantic_hits += 1
+            return [Generation(text=text) for text in json.loads(row[0])]
+
+    def _load_vectors(self) -> Dict[Tuple[str, str], List[Tuple[str, List[float]]]]:
+        if self._vectors is None:
+            self._vectors = {}
+            rows = self._conn.execute(
+                "SELECT key, llm_string, scope, embedding FROM llm_cache"
+                " WHERE embedding IS NOT NULL AND scope IS NOT NULL"
+            )
+            for key, llm_string, scope, blob in rows:
+                self._vectors.setdefault((llm_string, scope), []).append((key, _unpack(blob)))
+        return self._vectors
+
+    def _touch(self, key: str) -> None:
+        self._touched[key] = time.time()
+        self._unwritten_hits += 1
+        if self._unwritten_hits >= TOUCH_BATCH:
+            self._flush_touches()
+            self._conn.commit()
+
+    def _flush_touches(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE llm_cache SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+        self._unwritten_hits = 0
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if self.bypass:
+            return
+        key = _key(prompt, llm_string)
+        response = json.dumps([generation.text for generation in return_val])
+        scope = _scope.get()
+        vector = self._embed_tail(prompt) if self.semantic and scope is not None else None
+        with self._lock:
+            self._flush_touches()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string, response, embedding, scope, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, llm_string, response, _pack(vector) if vector else None, scope, time.time()),
+            )
+            if self._vectors is not None:
+                for (cached_llm_string, _), entries in self._vectors.items():
+                    if cached_llm_string == llm_string:
+                        entries[:] = [(k, v) for k, v in entries if k != key]
+                if vector is not None and scope is not None:
+                    self._vectors.setdefault((llm_string, scope), []).append((key, vector))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN"
+            " (SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+            (overflow,),
+        )
+        self._vectors = None  # rebuilt from the surviving rows on next semantic lookup
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._touched.clear()
+            self._unwritten_hits = 0
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._vectors = None
+
+    def stats(self) -> Dict[str, int]:
+        (size,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        return {
+            "size": size,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
+
+
+_shared_cache: Optional[PersistentLLMCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_llm_cache() -> PersistentLLMCache:
+    """
+    The process-wide LLM cache, configured from the environment:
+    CORTEX_LLM_CACHE_PATH, CORTEX_LLM_CACHE_MAX_ENTRIES, CORTEX_LLM_CACHE_SEMANTIC (1 to enable)
+    and CORTEX_LLM_CACHE_THRESHOLD.
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = PersistentLLMCache(
+                path=os.getenv("CORTEX_LLM_CACHE_PATH", "llm_cache/cache.sqlite3"),
+                max_entries=int(os.getenv("CORTEX_LLM_CACHE_MAX_ENTRIES", "10000")),
+                semantic=os.getenv("CORTEX_LLM_CACHE_SEMANTIC", "0") == "1",
+                semantic_threshold=float(os.getenv("CORTEX_LLM_CACHE_THRESHOLD", "0.95")),
+            )
+        return _shared_cache
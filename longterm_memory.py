@@ -3,37 +3,457 @@
 # pyright: reportUnknownMemberType=false
 
 from langchain.docstore.document import Document
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from typing import List
-import os
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union, cast
+import argparse
+import asyncio
+import atexit
+import hashlib
+import logging
+import queue
+import threading
+import time
+
+from cache import TTLCache, bump_collection_version, collection_version, normalize_query
+from data.backend import batch_similarity_search, vector_backend
+from tracing import get_tracer
+
+if TYPE_CHECKING:
+    from chromadb.api import ClientAPI
+    from langchain_chroma import Chroma
+    from data.numpy_store import NumpyVectorStore
+from models.embedding_model import get_embedding_model
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "longterm-memory"
+LEGACY_COLLECTION_NAME = "langchain"  # used by stores opened from an existing directory before compaction existed
+STAGING_COLLECTION_NAME = "longterm-memory-rewrite"  # a rewrite copies the surviving rows here first
+DEFAULT_USER = "default"
+
+
+class Fact(NamedTuple):
+    text: str
+    fact_type: Optional[str] = None  # e.g. "name"; keyed facts keep one current value per user
+    user_id: str = DEFAULT_USER
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()
+
+
+def fact_id(user_id: str, fact_type: Optional[str], text: str) -> str:
+    """Keyed facts upsert on (user, type); untyped facts are deduplicated by content hash."""
+    if fact_type:
+        return f"{user_id}:{fact_type}"
+    return f"{user_id}:{content_hash(text)[:32]}"
+
+
+def memory_filter(
+    user_id: Optional[str] = None,
+    fact_type: Optional[str] = None,
+    since: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """A Chroma-style `where` filter restricting a search to one user, one fact type and/or facts updated since `since`."""
+    clauses: List[Dict[str, Any]] = []
+    if user_id is not None:
+        clauses.append({"user_id": {"$eq": user_id}})
+    if fact_type is not None:
+        clauses.append({"fact_type": {"$eq": fact_type}})
+    if since is not None:
+        clauses.append({"updated_at": {"$gte": since}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
 
 class LongTermMemory:
-    def __init__(self, persist_directory: str = "longterm_memory"):
+    """
+    Persistent fact store backed by a Chroma collection, or by a memory-mapped
+    NumpyVectorStore when `backend="numpy"` (default from CORTEX_VECTOR_BACKEND).
+
+    Facts are stored under deterministic ids, so repeating a fact is a no-op and a new
+    value for a keyed fact type (one per user) replaces the old one. When `fact_ttl`
+    (seconds) or `max_facts` is set, expired and then least recently updated facts are
+    evicted every `evict_every` writes. `compact()` rewrites the collection offline.
+
+    Every fact carries `user_id`, `fact_type` and `updated_at` metadata. Queries given a
+    `user_id` (and optionally a fact type or `since` timestamp) are filtered to that
+    namespace before the similarity search: Chroma resolves the filter from its metadata
+    index and scores only the matching rows, and the numpy backend keeps a per-user row
+    index. `delete_user()` drops a whole namespace in one call.
+
+    The vector store (and Chroma itself) is only opened on first use, so constructing
+    the store at startup is cheap.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str = "longterm_memory",
+        cache_size: int = 256,
+        cache_ttl: Optional[float] = 300.0,
+        max_facts: Optional[int] = 10_000,
+        fact_ttl: Optional[float] = None,
+        evict_every: int = 100,
+        backend: Optional[str] = None,
+    ):
         self.persist_directory = persist_directory
-        self.embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        self.vstore: Chroma = self._load_vectorstore()
-
-    def _load_vectorstore(self) -> Chroma:
-        if os.path.exists(self.persist_directory):
-            return Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embedding_model,
+        self.backend = backend or vector_backend()
+        self.max_facts = max_facts
+        self.fact_ttl = fact_ttl
+        self.evict_every = evict_every
+        self._writes_since_evict = 0
+        self.embedding_model = get_embedding_model()
+        self._vstore: Optional[Union["Chroma", "NumpyVectorStore"]] = None
+        self._vstore_lock = threading.Lock()
+        self.result_cache: TTLCache[List[str]] = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    @property
+    def vstore(self) -> Union["Chroma", "NumpyVectorStore"]:
+        if self._vstore is None:
+            with self._vstore_lock:
+                if self._vstore is None:
+                    self._vstore = self._load_vectorstore()
+        return self._vstore
+
+    def _load_vectorstore(self) -> Union["Chroma", "NumpyVectorStore"]:
+        if self.backend == "numpy":
+            from data.backend import vector_dtype
+            from data.numpy_store import NumpyVectorStore
+            return NumpyVectorStore(
+                self.persist_directory, self.embedding_model, dtype=vector_dtype(), index_keys=("user_id",)
             )
-        else:
-            # Create an empty persistent Chroma store without inserting anything
-            return Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embedding_model,
-                collection_name="longterm-memory"
+        import chromadb
+        from langchain_chroma import Chroma
+
+        # Stores written before facts had their own collection keep them in the legacy
+        # one; fold those into COLLECTION_NAME so they stay searchable. If that fails, the
+        # legacy collection is left as it was and the migration is retried on the next open.
+        client = chromadb.PersistentClient(path=self.persist_directory)
+        if LEGACY_COLLECTION_NAME in self._finish_rewrite(client):
+            try:
+                migrated = self._rewrite(client, evict=False)
+            except Exception as e:
+                logger.warning("Could not migrate legacy facts into `%s`, keeping the legacy collection: %s", COLLECTION_NAME, e)
+            else:
+                logger.info("Migrated %d legacy fact(s) into `%s`.", migrated["after"], COLLECTION_NAME)
+                bump_collection_version(self.persist_directory)
+        # Creates an empty persistent collection on first use without inserting anything
+        return Chroma(
+            persist_directory=self.persist_directory,
+            embedding_function=self.embedding_model,
+            collection_name=COLLECTION_NAME,
+        )
+
+
+    def save_fact(self, text: str, fact_type: Optional[str] = None, user_id: str = DEFAULT_USER):
+        self.save_facts([Fact(text, fact_type, user_id)])
+
+    def save_facts(self, facts: Sequence[Union[str, Fact]]):
+        """
+        Embeds and upserts several facts with a single batched `add_documents` call.
+        Within a batch, the last value for a given id wins.
+        """
+        if not facts:
+            return
+        now = time.time()
+        by_id: Dict[str, Document] = {}
+        for item in facts:
+            fact = Fact(item) if isinstance(item, str) else item
+            by_id[fact_id(fact.user_id, fact.fact_type, fact.text)] = Document(
+                page_content=fact.text,
+                metadata={
+                    "user_id": fact.user_id,
+                    "fact_type": fact.fact_type or "",
+                    "content_hash": content_hash(fact.text),
+                    "updated_at": now,
+                },
             )
+        with get_tracer().span("ltm.save_facts", facts=len(by_id)):
+            self.vstore.add_documents(list(by_id.values()), ids=list(by_id.keys()))
+
+        self._writes_since_evict += len(by_id)
+        if self._writes_since_evict >= self.evict_every:
+            self._writes_since_evict = 0
+            self.evict()
+        bump_collection_version(self.persist_directory)
+
+    def evict(self) -> int:
+        """Deletes expired facts, then the least recently updated ones beyond `max_facts`."""
+        if self.fact_ttl is None and self.max_facts is None:
+            return 0
+        data = self.vstore.get(include=["metadatas"])
+        doomed = self._select_evictions(data["ids"], data["metadatas"])
+        if doomed:
+            self.vstore.delete(ids=doomed)
+            bump_collection_version(self.persist_directory)
+        return len(doomed)
+
+    def delete_user(self, user_id: str) -> int:
+        """Deletes every fact in `user_id`'s namespace. Returns how many were removed."""
+        where = memory_filter(user_id=user_id)
+        doomed = self.vstore.get(where=where, include=[])["ids"]
+        if doomed:
+            self.vstore.delete(ids=doomed)
+            bump_collection_version(self.persist_directory)
+        return len(doomed)
+
+    def _select_evictions(self, ids: List[str], metadatas: Sequence[Optional[Dict[str, Any]]]) -> List[str]:
+        cutoff = time.time() - self.fact_ttl if self.fact_ttl is not None else None
+        ages = sorted(
+            (float(meta.get("updated_at", 0.0)) if meta else 0.0, fid) for fid, meta in zip(ids, metadatas)
+        )
+        doomed = [fid for updated, fid in ages if cutoff is not None and updated < cutoff]
+        survivors = [fid for updated, fid in ages if cutoff is None or updated >= cutoff]
+        if self.max_facts is not None and len(survivors) > self.max_facts:
+            doomed.extend(survivors[: len(survivors) - self.max_facts])
+        return doomed
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Rewrites the store offline: merges the legacy collection, collapses duplicates and
+        superseded keyed facts (keeping the newest), applies eviction, and recreates the
+        collection from the surviving rows, reusing their stored embeddings.
+
+        The numpy backend keeps one row per fact id and has no legacy collection, so there
+        eviction is applied and then its write log is folded into a fresh export.
+        """
+        if self.backend == "numpy":
+            store = cast("NumpyVectorStore", self.vstore)
+            before = len(store)
+            self.evict()
+            store.compact()
+            return {"before": before, "after": len(store)}
+
+        import chromadb
+
+        result = self._rewrite(chromadb.PersistentClient(path=self.persist_directory), evict=True)
+        self._vstore = self._load_vectorstore()
+        bump_collection_version(self.persist_directory)
+        return result
+
+    @staticmethod
+    def _collection_names(client: "ClientAPI") -> List[str]:
+        return [collection.name for collection in client.list_collections()]
+
+    def _finish_rewrite(self, client: "ClientAPI") -> List[str]:
+        """
+        Settles a rewrite that was interrupted: the staging collection is complete only once
+        COLLECTION_NAME has been dropped, so it then becomes COLLECTION_NAME; otherwise it is
+        a partial copy and is discarded. Returns the collection names afterwards.
+        """
+        existing = self._collection_names(client)
+        if STAGING_COLLECTION_NAME in existing:
+            if COLLECTION_NAME in existing:
+                client.delete_collection(STAGING_COLLECTION_NAME)
+            else:
+                client.get_collection(STAGING_COLLECTION_NAME).modify(name=COLLECTION_NAME)
+            existing = self._collection_names(client)
+        return existing
+
+    def _rewrite(self, client: "ClientAPI", evict: bool) -> Dict[str, int]:
+        """
+        Reads the legacy and current collections, keeps the newest row per fact id
+        (filling in metadata that older rows lack), optionally applies eviction, and
+        recreates COLLECTION_NAME from the survivors with their stored embeddings.
+
+        The survivors are written to a staging collection first, and the old collections are
+        dropped only after every row has been copied, so a failure leaves them untouched.
+        """
+        existing = self._finish_rewrite(client)
+        rows: Dict[str, Tuple[str, Dict[str, Any], Any]] = {}
+        before = 0
+        for name in (LEGACY_COLLECTION_NAME, COLLECTION_NAME):
+            if name not in existing:
+                continue
+            data = client.get_collection(name).get(include=["documents", "metadatas", "embeddings"])
+            documents = data["documents"] or []
+            metadatas = data["metadatas"] or [None] * len(documents)
+            embeddings = data["embeddings"] if data["embeddings"] is not None else []
+            before += len(data["ids"])
+            for text, stored, vector in zip(documents, metadatas, embeddings):
+                meta: Dict[str, Any] = dict(stored or {})
+                meta.setdefault("user_id", DEFAULT_USER)
+                meta.setdefault("fact_type", "")
+                meta.setdefault("content_hash", content_hash(text))
+                meta.setdefault("updated_at", 0.0)
+                key = fact_id(str(meta["user_id"]), str(meta["fact_type"]), text)
+                kept = rows.get(key)
+                if kept is None or float(meta["updated_at"]) >= float(kept[1]["updated_at"]):
+                    rows[key] = (text, meta, vector)
+
+        if evict:
+            for key in self._select_evictions(list(rows), [meta for _, meta, _ in rows.values()]):
+                del rows[key]
+
+        staging = client.create_collection(STAGING_COLLECTION_NAME)
+        ids = list(rows)
+        step = client.get_max_batch_size()
+        try:
+            for i in range(0, len(ids), step):
+                batch = ids[i:i + step]
+                staging.add(
+                    ids=batch,
+                    documents=[rows[k][0] for k in batch],
+                    metadatas=[rows[k][1] for k in batch],
+                    embeddings=[rows[k][2] for k in batch],
+                )
+        except Exception:
+            client.delete_collection(STAGING_COLLECTION_NAME)
+            raise
+
+        if COLLECTION_NAME in existing:
+            client.delete_collection(COLLECTION_NAME)
+        staging.modify(name=COLLECTION_NAME)
+        if LEGACY_COLLECTION_NAME in existing:
+            client.delete_collection(LEGACY_COLLECTION_NAME)
+        return {"before": before, "after": len(ids)}
+
+    async def asave_fact(self, text: str, fact_type: Optional[str] = None, user_id: str = DEFAULT_USER):
+        await asyncio.to_thread(self.save_fact, text, fact_type, user_id)
+
+    async def aquery(self, query: str, k: int = 3, **filters: Any) -> List[str]:
+        return await asyncio.to_thread(lambda: self.query(query, k, **filters))
+
+    async def aquery_many(self, queries: List[str], k: int = 3, **filters: Any) -> List[List[str]]:
+        return await asyncio.to_thread(lambda: self.query_many(queries, k, **filters))
+
+    def query(
+        self,
+        query: str,
+        k: int = 3,
+        user_id: Optional[str] = None,
+        fact_type: Optional[str] = None,
+        since: Optional[float] = None,
+    ) -> List[str]:
+        return self.query_many([query], k=k, user_id=user_id, fact_type=fact_type, since=since)[0]
+
+    def query_many(
+        self,
+        queries: List[str],
+        k: int = 3,
+        user_id: Optional[str] = None,
+        fact_type: Optional[str] = None,
+        since: Optional[float] = None,
+    ) -> List[List[str]]:
+        """
+        Facts for several queries, one list per query in order, optionally restricted to
+        one user's namespace, a fact type and facts updated at or after `since`. Uncached
+        queries are embedded in one batch and searched with one batched vector-store call.
+        """
+        where = memory_filter(user_id, fact_type, since)
+        with get_tracer().span("ltm.query", k=k, queries=len(queries), filtered=where is not None) as span:
+            version = collection_version(self.persist_directory)
+            keys = [(normalize_query(q), k, version, user_id, fact_type, since) for q in queries]
+            results: List[Optional[List[str]]] = [self.result_cache.get(key) for key in keys]
+            missing = [i for i, r in enumerate(results) if r is None]
+            span["cached"] = len(queries) - len(missing)
+
+            if missing:
+                vectors = self.embedding_model.embed_queries([queries[i] for i in missing])
+                with get_tracer().span("vector_search.longterm", k=k, queries=len(missing), backend=self.backend):
+                    found = batch_similarity_search(self.vstore, vectors, k=k, filter=where)
+                for i, docs in zip(missing, found):
+                    texts = list(dict.fromkeys(doc.page_content for doc in docs))
+                    self.result_cache.set(keys[i], texts)
+                    results[i] = texts
+            return [list(r or []) for r in results]
+
+
+
+class WriteBehindQueue:
+    """
+    Persists facts to a LongTermMemory store from a background thread so that callers
+    never wait on embedding or Chroma writes.
+
+    Queued facts are coalesced into batches of up to `batch_size`, waiting at most
+    `flush_interval` seconds for more to arrive, and written with one `save_facts` call.
+    `depth` counts facts not yet written; `flush()` waits for them, and `close()` (also
+    registered with atexit) flushes and stops the worker.
+    """
+
+    def __init__(self, store: LongTermMemory, batch_size: int = 32, flush_interval: float = 0.5):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.failed = 0
+        self._queue: "queue.Queue[Optional[Fact]]" = queue.Queue()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ltm-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def depth(self) -> int:
+        return self._pending
+
+    def put(self, fact: Union[str, Fact]) -> None:
+        if self._closed:
+            raise RuntimeError("WriteBehindQueue is closed.")
+        with self._idle:
+            self._pending += 1
+        self._queue.put(Fact(fact) if isinstance(fact, str) else fact)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until every queued fact has been written. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
 
+    def _write(self, batch: List[Fact]) -> None:
+        try:
+            self.store.save_facts(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning("Failed to save %d fact(s): %s", len(batch), e)
+        finally:
+            with self._idle:
+                self._pending -= len(batch)
+                self._idle.notify_all()
 
-    def save_fact(self, text: str):
-        doc = Document(page_content=text)
-        self.vstore.add_documents([doc])
-        
 
-    def query(self, query: str, k: int = 3) -> List[str]:
-        results = self.vstore.similarity_search(query, k=k)
-        return [doc.page_content for doc in results]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-term memory maintenance.")
+    parser.add_argument("command", choices=["compact", "delete-user"])
+    parser.add_argument("--persist-directory", default="longterm_memory")
+    parser.add_argument("--user-id", default=None, help="Namespace to delete (delete-user).")
+    parser.add_argument("--max-facts", type=int, default=10_000)
+    parser.add_argument("--fact-ttl", type=float, default=None, help="Drop facts not updated for this many seconds.")
+    args = parser.parse_args()
+    store = LongTermMemory(args.persist_directory, max_facts=args.max_facts, fact_ttl=args.fact_ttl)
+    if args.command == "delete-user":
+        if not args.user_id:
+            parser.error("delete-user requires --user-id")
+        print(f"Deleted {store.delete_user(args.user_id)} fact(s) for user `{args.user_id}`.")
+    else:
+        result = store.compact()
+        print(f"Compacted `{args.persist_directory}`: {result['before']} -> {result['after']} facts.")
@@ -1,62 +1,159 @@
-from agent import get_agent
-from typing import Any, List
-from langchain.schema import BaseMessage
+import time
+_STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+from agent import get_agent, get_shared_tools, load_llm
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+from langchain_core.callbacks import BaseCallbackHandler
 from handlers.spinner import spinner
+from handlers.streaming import ConsoleStreamHandler
+from llm_cache import cache_scope
 from tools.fact_saver import FactSaver
-from longterm_memory import LongTermMemory
+from longterm_memory import DEFAULT_USER, LongTermMemory
+from router import FastPathRouter, IntentClassifier
+from tools.registry import LazyTool
 
+_IMPORTED = time.perf_counter()
+T = TypeVar("T")
 
-def format_chat_history(messages: List[BaseMessage]):
-    lines: List[str] = []
-    for msg in messages:
-        role = "Human" if msg.type == "human" else "AI"
-        content = (
-            msg.content if isinstance(msg.content, str) # type: ignore
-            else str(msg.content) # type: ignore
-        )
-        lines.append(f"{role}: {content}")
-    return "\n".join(lines)
 
-def inject_memory_into_input(history: str, user_input: str) -> str:
-    return f"{history}\n\nHuman: {user_input}"
+async def respond(
+    agent: Any,
+    memory: Any,
+    fact_saver: FactSaver,
+    query: str,
+    callbacks: Optional[List[BaseCallbackHandler]] = None,
+    session_id: str = "cli",
+    router: Optional[FastPathRouter] = None,
+    user_id: str = DEFAULT_USER,
+) -> dict[str, Any]:
+    """
+    Runs one conversational turn without blocking the event loop, so several
+    conversations can be served concurrently from one process. `callbacks` receive
+    LLM tokens and tool events as they happen. `session_id` and `user_id` are passed to
+    tools through the run metadata (the Python REPL keeps one namespace per session, and
+    long-term memory reads and writes only `user_id`'s facts).
 
+    With a `router`, simple queries are answered by a single tool call (plus at most one
+    summarizing LLM call) and the ReAct agent is skipped; the turn is still recorded in
+    memory.
 
-def main():
+    Chat history reaches the prompt only through the agent memory's `{chat_history}`
+    variable, which is token-budgeted; it is not repeated in the input.
     """
-    Main function to run the agent.
+    fact_saver.maybe_save_fact(query, user_id)  # only queues; persisted off the request path
+    metadata = {"session_id": session_id, "user_id": user_id}
+
+    with cache_scope(user_id):  # semantic LLM-cache hits only come from this user's answers
+        if router is not None:
+            routed = await router.aroute(query, metadata=metadata)
+            if routed is not None:
+                memory.save_context({"input": query}, {"output": routed.output})
+                return {"input": query, "output": routed.output, "route": routed.tool}
+
+        return await agent.ainvoke(
+            {"input": query},
+            config={"callbacks": callbacks or [], "metadata": metadata},
+        )
+
+
+async def amain(stream: bool = True, fast_path: bool = True, user_id: str = DEFAULT_USER):
+    """
+    Async main loop: reads input on a worker thread and drives the agent with `ainvoke`.
+    With `stream`, tool calls and final-answer tokens are printed as they are generated
+    and the spinner only runs until the first token arrives. With `fast_path`, simple
+    queries are answered by the router without running the agent.
     """
     print("Welcome to Agent Cortex! Type 'exit' or 'quit' to stop.")
-    agent, memory = get_agent()
     ltm = LongTermMemory()
+    llm = load_llm()
+    agent, memory = get_agent(shared_tools=get_shared_tools(ltm), llm=llm)
     fact_saver = FactSaver(ltm)
+    router = FastPathRouter(agent.tools, llm=llm, classifier=IntentClassifier()) if fast_path else None
 
 
     while True:
 
         
-        query = input("\n⟁ You: ")
+        query = await asyncio.to_thread(input, "\n⟁ You: ")
         if query.lower() in ["exit", "quit"]:
             print("Shutting down Cortex")
+            fact_saver.close()
             break
         stop_spinner = spinner("Thinking...")
         response: None | dict[str, Any] = None
+        stream_handler = ConsoleStreamHandler(on_first_token=stop_spinner) if stream else None
         try: 
-            fact_saver.maybe_save_fact(query)
-
-            formatted_history = format_chat_history(memory.chat_memory.messages)
-            full_input = inject_memory_into_input(formatted_history, query)
-
-            response = agent.invoke({
-                "input": full_input,
-                "chat_history": memory,
-            })
+            response = await respond(
+                agent, memory, fact_saver, query,
+                callbacks=[stream_handler] if stream_handler else None,
+                router=router, user_id=user_id,
+            )
 
         except Exception as e:
+            stop_spinner()
             print(f"Error: {e}")
         finally:
             stop_spinner()
             if response is not None:
-                print(f"\n⚇ Cortex: {response['output']}\n")
+                if stream_handler is not None and stream_handler.answer_streamed:
+                    print("\n")
+                else:
+                    print(f"\n⚇ Cortex: {response['output']}\n")
+
+
+def profile_startup() -> None:
+    """
+    Reports how long each startup component takes: module imports, building the agent
+    (the time until the first prompt, including each tool module's import), then
+    constructing each lazily loaded tool and loading the embedding model, as a first
+    query would.
+    """
+    rows: List[Tuple[str, float]] = [("import main, agent and dependencies", _IMPORTED - _STARTED)]
+
+    def step(label: str, fn: Callable[[], T]) -> T:
+        started = time.perf_counter()
+        result = fn()
+        rows.append((label, time.perf_counter() - started))
+        return result
+
+    ltm = step("LongTermMemory()", LongTermMemory)
+    llm = step("load_llm()", load_llm)
+    shared_tools = step("get_shared_tools()", lambda: get_shared_tools(ltm))
+    step("get_agent()", lambda: get_agent(shared_tools=shared_tools, llm=llm))
+    step("FactSaver()", lambda: FactSaver(ltm, write_behind=False))
+    ready = time.perf_counter() - _STARTED
+
+    for tool in shared_tools:
+        if isinstance(tool, LazyTool):
+            tool.resolve()
+            rows.append((f"import {tool.name}", tool.import_seconds or 0.0))
+            rows.append((f"init {tool.name}", tool.init_seconds or 0.0))
+    from models.embedding_model import get_embedding_model
+    step("load embedding model", lambda: get_embedding_model().model)
+
+    width = max(len(label) for label, _ in rows)
+    for label, seconds in rows:
+        print(f"{label:<{width}}  {seconds * 1000:9.1f} ms")
+    print(f"{'ready for first prompt':<{width}}  {ready * 1000:9.1f} ms")
+    print(f"{'everything loaded':<{width}}  {(time.perf_counter() - _STARTED) * 1000:9.1f} ms")
+
+
+def main():
+    """
+    Main function to run the agent.
+    """
+    parser = argparse.ArgumentParser(description="Agent Cortex CLI")
+    parser.add_argument("--no-stream", action="store_true", help="Print each response only once it is complete.")
+    parser.add_argument("--no-fast-path", action="store_true", help="Send every query through the full agent.")
+    parser.add_argument("--user", default=DEFAULT_USER, help="Long-term memory namespace to read and write.")
+    parser.add_argument("--profile-startup", action="store_true", help="Report import and init time per component, then exit.")
+    args = parser.parse_args()
+    if args.profile_startup:
+        profile_startup()
+        return
+    asyncio.run(amain(stream=not args.no_stream, fast_path=not args.no_fast_path, user_id=args.user))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
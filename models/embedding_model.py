@@ -1,10 +1,353 @@
-from sentence_transformers import SentenceTransformer
+# pyright: reportUnknownMemberType=false
 
-# future if we want to have our own embedding model
-class EmbeddingModel:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+import os
+import queue
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Protocol, cast
+
+from langchain_core.embeddings import Embeddings
+
+from cache import TTLCache, normalize_query
+from tracing import get_tracer
+
+if TYPE_CHECKING:
+    # numpy is imported where vectors are computed, so importing this module stays cheap.
+    import numpy as np
+    import numpy.typing as npt
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _hub_repo(model_name: str) -> str:
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+class EncoderBackend(Protocol):
+    """Turns texts into L2-normalized sentence embeddings."""
+
+    tokenizer: Any
+
+    def encode(self, texts: List[str]) -> List[List[float]]: ...
+
+
+class TorchBackend:
+    """Full-precision PyTorch inference through sentence-transformers."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, threads: Optional[int] = None):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
         self.model = SentenceTransformer(model_name)
+        self.tokenizer: Any = self.model.tokenizer
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        vectors: "npt.NDArray[np.float32]" = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+        return vectors.tolist()
+
+
+def _mean_pool(hidden: "npt.NDArray[np.float32]", attention_mask: "npt.NDArray[np.int64]") -> "npt.NDArray[np.float32]":
+    """sentence-transformers mean pooling: the average of unmasked token states, L2-normalized."""
+    import numpy as np
+
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return (pooled / norms).astype(np.float32)
+
+
+class ONNXBackend:
+    """
+    ONNX Runtime inference of the same transformer, with the sentence-transformers
+    mean pooling and normalization reproduced in NumPy.
+
+    The model is exported from the Hugging Face checkpoint to `<onnx_dir>/<model>/model.onnx`
+    on first use and, with `quantize=True`, dynamically quantized to int8 weights
+    (`model.int8.onnx`). Both files are reused by later processes.
+
+    Texts are sorted by length and encoded in batches of `batch_size`, so each batch is
+    padded only to its own longest text; results are returned in input order.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL_NAME,
+        quantize: bool = True,
+        threads: Optional[int] = None,
+        batch_size: int = 32,
+        max_length: int = 256,
+        onnx_dir: str = "onnx_models",
+    ):
+        try:
+            import onnxruntime as ort  # pyright: ignore[reportMissingTypeStubs]
+        except ImportError as e:
+            raise ImportError("The ONNX embedding backend requires `pip install onnxruntime`.") from e
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.directory = os.path.join(onnx_dir, model_name.replace("/", "__"))
+        self.tokenizer: Any = AutoTokenizer.from_pretrained(_hub_repo(model_name))
+
+        path = self._export()
+        if quantize:
+            path = self._quantize(path)
+        options = cast(Any, ort.SessionOptions())
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session: Any = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input_names: set[str] = {str(i.name) for i in self.session.get_inputs()}
+
+    def _export(self) -> str:
+        path = os.path.join(self.directory, "model.onnx")
+        if os.path.exists(path):
+            return path
+        import torch
+        from transformers import AutoModel
+
+        os.makedirs(self.directory, exist_ok=True)
+        model = cast(Any, AutoModel.from_pretrained(_hub_repo(self.model_name))).eval()
+        sample: Dict[str, Any] = dict(self.tokenizer(["export"], return_tensors="pt"))
+        names = ["input_ids", "attention_mask", "token_type_ids"]
+        names = [n for n in names if n in sample]
+        axes = {n: {0: "batch", 1: "sequence"} for n in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        tmp_path = path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[n] for n in names),
+                tmp_path,
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=axes,
+                opset_version=14,
+            )
+        os.replace(tmp_path, path)
+        return path
+
+    def _quantize(self, path: str) -> str:
+        quantized = os.path.join(self.directory, "model.int8.onnx")
+        if not os.path.exists(quantized):
+            from onnxruntime.quantization import (  # pyright: ignore[reportMissingTypeStubs]
+                QuantType,
+                quantize_dynamic,  # pyright: ignore[reportUnknownVariableType]
+            )
+
+            tmp_path = quantized + ".tmp"
+            quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, quantized)
+        return quantized
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out: List[List[float]] = [[] for _ in texts]
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            encoded: Dict[str, Any] = dict(self.tokenizer(
+                [texts[i] for i in rows],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            ))
+            inputs: Dict[str, "npt.NDArray[np.int64]"] = {
+                name: np.asarray(value, dtype=np.int64) for name, value in encoded.items()
+            }
+            feed = {name: value for name, value in inputs.items() if name in self._input_names}
+            hidden: "npt.NDArray[np.float32]" = self.session.run(["last_hidden_state"], feed)[0]
+            vectors: List[List[float]] = _mean_pool(hidden, inputs["attention_mask"]).tolist()
+            for row, vector in zip(rows, vectors):
+                out[row] = vector
+        return out
+
+
+def load_backend(
+    backend: str = "torch",
+    model_name: str = DEFAULT_MODEL_NAME,
+    threads: Optional[int] = None,
+) -> EncoderBackend:
+    """Constructs an encoder backend by name: "torch", "onnx" (fp32) or "onnx-int8"."""
+    if backend == "torch":
+        return TorchBackend(model_name, threads=threads)
+    if backend in ("onnx", "onnx-int8"):
+        return ONNXBackend(model_name, quantize=backend == "onnx-int8", threads=threads)
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(BACKENDS)}.")
+
+
+def backend_from_env() -> str:
+    """The embedding backend named by CORTEX_EMBEDDING_BACKEND (default "torch")."""
+    backend = os.getenv("CORTEX_EMBEDDING_BACKEND", "torch").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(BACKENDS)}.")
+    return backend
+
+
+def threads_from_env() -> Optional[int]:
+    """Inference threads from CORTEX_EMBEDDING_THREADS; unset leaves the runtime default."""
+    value = os.getenv("CORTEX_EMBEDDING_THREADS")
+    return int(value) if value else None
+
+
+class _EmbedRequest:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result: List[List[float]] = []
+        self.error: Optional[BaseException] = None
+
+
+class EmbeddingModel(Embeddings):
+    """
+    Sentence-transformer embeddings shared by every vector store and tool.
+
+    Inference runs on a pluggable backend: "torch" (sentence-transformers), "onnx" or
+    "onnx-int8" (ONNX Runtime, the latter with int8-quantized weights), by default the
+    one named by CORTEX_EMBEDDING_BACKEND, with CORTEX_EMBEDDING_THREADS inference threads.
+    All backends return L2-normalized vectors.
+
+    The backend is loaded on first use rather than at construction, and
+    concurrent `embed` calls are gathered by a single worker thread into one
+    forward pass (up to `max_batch_size` texts, waiting at most `batch_window`
+    seconds for more callers to arrive).
+
+    Query embeddings are memoized in an LRU cache keyed by the normalized query
+    text, so a repeated lookup skips the forward pass entirely.
+
+    Implements LangChain's `Embeddings` interface so it can be handed directly to
+    Chroma as `embedding_function`.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL_NAME,
+        max_batch_size: int = 64,
+        batch_window: float = 0.005,
+        query_cache_size: int = 2048,
+        backend: Optional[str] = None,
+        threads: Optional[int] = None,
+    ):
+        self.model_name = model_name
+        self.backend = backend or backend_from_env()
+        self.threads = threads if threads is not None else threads_from_env()
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self._model: Any = None
+        self._load_lock = threading.Lock()
+        self._requests: "queue.Queue[_EmbedRequest]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self.query_cache: TTLCache[List[float]] = TTLCache(maxsize=query_cache_size, ttl=None)
+        self._tokenizer: Any = None
+
+    @property
+    def model(self) -> EncoderBackend:
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = load_backend(self.backend, self.model_name, self.threads)
+        return self._model
+
+    @property
+    def tokenizer(self) -> Any:
+        """The model's tokenizer, loaded on its own so chunking doesn't require the full model."""
+        if self._model is not None:
+            return self._model.tokenizer
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = cast(Any, AutoTokenizer.from_pretrained(_hub_repo(self.model_name)))
+        return self._tokenizer
 
     def embed(self, texts: list[str]) -> list[list[float]]:
-        return self.model.encode(texts, convert_to_numpy=True).tolist()
-    
\ No newline at end of file
+        if not texts:
+            return []
+        request = _EmbedRequest(list(texts))
+        self._ensure_worker()
+        self._requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        vector = self.embed([text])[0]
+        self.query_cache.set(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """`embed_query` for many queries: cache misses are encoded together in one batch."""
+        keys = [normalize_query(text) for text in texts]
+        vectors: List[Optional[List[float]]] = [self.query_cache.get(key) for key in keys]
+        missing = {key: text for key, text, vector in zip(keys, texts, vectors) if vector is None}
+        encoded = dict(zip(missing, self.embed(list(missing.values())))) if missing else {}
+        for key, vector in encoded.items():
+            self.query_cache.set(key, vector)
+        return [vector if vector is not None else encoded[key] for key, vector in zip(keys, vectors)]
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._batch_loop, name="embedding-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0].texts)
+            while size < self.max_batch_size:
+                try:
+                    nxt = self._requests.get(timeout=self.batch_window)
+                except queue.Empty:
+                    break
+                batch.append(nxt)
+                size += len(nxt.texts)
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: List[_EmbedRequest]) -> None:
+        texts = [t for request in batch for t in request.texts]
+        try:
+            with get_tracer().span("embedding.batch", texts=len(texts), requests=len(batch), backend=self.backend):
+                vectors = self.model.encode(texts)
+        except BaseException as e:
+            for request in batch:
+                request.error = e
+                request.done.set()
+            return
+
+        offset = 0
+        for request in batch:
+            request.result = vectors[offset:offset + len(request.texts)]
+            offset += len(request.texts)
+            request.done.set()
+
+
+_shared_models: Dict[str, EmbeddingModel] = {}
+_shared_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str = DEFAULT_MODEL_NAME) -> EmbeddingModel:
+    """Returns the process-wide EmbeddingModel for `model_name`, creating it on first call."""
+    with _shared_lock:
+        model = _shared_models.get(model_name)
+        if model is None:
+            model = EmbeddingModel(model_name)
+            _shared_models[model_name] = model
+        return model
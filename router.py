@@ -0,0 +1,283 @@
+# router.py
+
+import ast
+import asyncio
+import math
+import re
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from langchain.tools import BaseTool
+from langchain_core.language_models import BaseLLM
+
+from models.embedding_model import EmbeddingModel, get_embedding_model
+from tools.registry import TOOL_UNAVAILABLE
+from tools.repl_pool import DEFAULT_PRELOAD
+
+
+class RouteResult(NamedTuple):
+    tool: str
+    output: str
+    method: str  # "rule" or "classifier"
+
+
+# Outputs that mean the tool had nothing useful; the query then falls through to the agent.
+UNHELPFUL_PREFIXES = (
+    "I tried to reason about your question",
+    "I couldn't find anything in long-term memory",
+    "(Retriever skipped",
+    "⚠️ Could not evaluate expression",
+    "No results found",
+)
+
+
+def _unhelpful(tool_name: str, output: str) -> bool:
+    """True for empty or no-result output, and for the error a lazy tool returns when it can't be built."""
+    return not output.strip() or output.startswith((*UNHELPFUL_PREFIXES, TOOL_UNAVAILABLE.format(name=tool_name)))
+
+# Tools whose raw output is passages rather than an answer, so they get one summarizing LLM call.
+SUMMARIZED_TOOLS = {"Retriever", "LongTermMemory", "WebSearch"}
+
+_MATH = re.compile(
+    r"^\s*(?:what\s+is|what's|calculate|compute|evaluate)?\s*"
+    r"(?=[\d\s.()+\-*/]*\d\s*[+\-*/]\s*[\d(])([\d\s.()+\-*/]+?)\s*[?=]?\s*$",
+    re.IGNORECASE,
+)
+_DATE = re.compile(r"\b(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{4})\b")  # looks like arithmetic, isn't
+_MY_NAME = re.compile(r"\b(?:what(?:'s| is) my name|who am i|do you (?:know|remember) my name)\b", re.IGNORECASE)
+_REALTIME = re.compile(r"\b(?:weather|forecast|temperature|news|headlines)\b", re.IGNORECASE)
+
+
+# Builtins a bare (un-backticked) query may call; anything else must be quoted as `code`.
+PYTHON_BUILTINS = frozenset({
+    "abs", "all", "any", "bin", "chr", "divmod", "float", "hex", "int", "len", "list", "max",
+    "min", "oct", "ord", "pow", "print", "range", "reversed", "round", "set", "sorted", "str",
+    "sum", "tuple", "zip",
+})
+
+
+def _python_expression(query: str) -> Optional[str]:
+    """
+    Returns code that prints the result when the whole query is a single Python call
+    expression that is clearly code: wrapped in backticks, or calling one of
+    `PYTHON_BUILTINS` or a function of a module the REPL preloads (e.g. `math.sqrt(2)`).
+    Prose that happens to parse as a call, like "help(me)", is left to the agent.
+    """
+    text = query.strip()
+    quoted = len(text) > 2 and text.startswith("`") and text.endswith("`")
+    code = text.strip("`").strip() if quoted else text
+    try:
+        tree = ast.parse(code, mode="eval")
+    except SyntaxError:
+        return None
+    if not isinstance(tree.body, ast.Call):
+        return None
+    func = tree.body.func
+    if not quoted:
+        while isinstance(func, ast.Attribute):
+            func = func.value
+        if not isinstance(func, ast.Name):
+            return None
+        if func.id not in PYTHON_BUILTINS and (func is tree.body.func or func.id not in DEFAULT_PRELOAD):
+            return None
+    if isinstance(tree.body.func, ast.Name) and tree.body.func.id == "print":
+        return code
+    return f"print({code})"
+
+
+# (matcher, candidate tools tried in order, optional input rewrite)
+Rule = Tuple[Callable[[str], bool], Sequence[str], Optional[Callable[[str], str]]]
+
+RULES: List[Rule] = [
+    (lambda q: bool(_MATH.match(q)) and not _DATE.search(q), ["Calculator"], None),
+    (lambda q: bool(_MY_NAME.search(q)), ["Reasoning", "LongTermMemory"], lambda q: "the user's name"),
+    (lambda q: _python_expression(q) is not None, ["python_repl"], lambda q: _python_expression(q) or q),
+    (lambda q: bool(_REALTIME.search(q)), ["WebSearch"], None),
+]
+
+DEFAULT_INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "Retriever": [
+        "When does the Bristol Fourth of July parade start?",
+        "Where can I watch the fireworks?",
+        "What happens at the carnival?",
+        "What is the parade route?",
+    ],
+    "LongTermMemory": [
+        "Where do I live?",
+        "What do you remember about me?",
+        "Where am I from?",
+    ],
+    "WebSearch": [
+        "What is the weather going to be tomorrow?",
+        "What is the latest news about this?",
+        "Who won the game last night?",
+    ],
+}
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class IntentClassifier:
+    """
+    Nearest-intent classifier over tool descriptions and example utterances, using the
+    shared embedding model. The intent vectors are embedded once, on first use, and the
+    classifier can be shared by every session's router.
+
+    A query is assigned to a tool only when its best similarity is at least `threshold`
+    and beats the best other tool by `margin`.
+    """
+
+    def __init__(
+        self,
+        examples: Optional[Dict[str, List[str]]] = None,
+        embedding_model: Optional[EmbeddingModel] = None,
+        threshold: float = 0.6,
+        margin: float = 0.08,
+    ):
+        self.examples = examples if examples is not None else DEFAULT_INTENT_EXAMPLES
+        self.embedding_model = embedding_model or get_embedding_model()
+        self.threshold = threshold
+        self.margin = margin
+        self._vectors: Optional[List[Tuple[str, List[float]]]] = None
+        self._lock = threading.Lock()
+
+    def prepare(self, tools: Sequence[BaseTool]) -> None:
+        if self._vectors is not None:
+            return
+        with self._lock:
+            if self._vectors is not None:
+                return
+            labelled: List[Tuple[str, str]] = []
+            for tool in tools:
+                if tool.name in self.examples:
+                    labelled.append((tool.name, tool.description))
+                    labelled.extend((tool.name, text) for text in self.examples[tool.name])
+            vectors = self.embedding_model.embed_documents([text for _, text in labelled])
+            self._vectors = [(name, vec) for (name, _), vec in zip(labelled, vectors)]
+
+    def classify(self, query: str) -> Optional[Tuple[str, float]]:
+        if not self._vectors:
+            return None
+        q = self.embedding_model.embed_query(query)
+        best: Dict[str, float] = {}
+        for name, vec in self._vectors:
+            best[name] = max(best.get(name, -1.0), _cosine(q, vec))
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        top_name, top_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if top_score >= self.threshold and top_score - runner_up >= self.margin:
+            return top_name, top_score
+        return None
+
+
+class RoutingStats:
+    """Counts how queries were handled; shared between routers to report process-wide hit rates."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.rule_hits = 0
+        self.classifier_hits = 0
+        self.by_tool: Dict[str, int] = {}
+
+    def record(self, result: Optional[RouteResult]) -> None:
+        with self._lock:
+            self.total += 1
+            if result is None:
+                return
+            if result.method == "rule":
+                self.rule_hits += 1
+            else:
+                self.classifier_hits += 1
+            self.by_tool[result.tool] = self.by_tool.get(result.tool, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            routed = self.rule_hits + self.classifier_hits
+            return {
+                "total": self.total,
+                "routed": routed,
+                "rule_hits": self.rule_hits,
+                "classifier_hits": self.classifier_hits,
+                "fallthrough": self.total - routed,
+                "hit_rate": routed / self.total if self.total else 0.0,
+                "by_tool": dict(self.by_tool),
+            }
+
+
+class FastPathRouter:
+    """
+    Answers simple queries before the ReAct agent runs.
+
+    Compiled rules (arithmetic, "what is my name", Python calls, real-time keywords)
+    are tried first, then the embedding intent classifier. A confident route calls one
+    tool directly; passage-returning tools get a single summarizing LLM call when `llm`
+    is set. If the tool's output is unhelpful, `route` returns None and the caller should
+    fall through to the full agent.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        llm: Optional[BaseLLM] = None,
+        classifier: Optional[IntentClassifier] = None,
+        stats: Optional[RoutingStats] = None,
+        rules: Optional[List[Rule]] = None,
+    ):
+        self.tools = {tool.name: tool for tool in tools}
+        self.llm = llm
+        self.classifier = classifier
+        self.stats = stats or RoutingStats()
+        self.rules = rules if rules is not None else RULES
+
+    def _candidates(self, query: str) -> List[Tuple[str, str, str]]:
+        """(tool name, tool input, method) pairs to try, best first."""
+        for matches, tool_names, rewrite in self.rules:
+            if matches(query):
+                tool_input = rewrite(query) if rewrite else query
+                return [(name, tool_input, "rule") for name in tool_names if name in self.tools]
+        if self.classifier is not None:
+            self.classifier.prepare(list(self.tools.values()))
+            intent = self.classifier.classify(query)
+            if intent is not None and intent[0] in self.tools:
+                return [(intent[0], query, "classifier")]
+        return []
+
+    def _summarize_prompt(self, query: str, context: str) -> str:
+        return (
+            "Answer the question concisely using only the context below.\n\n"
+            f"Context:\n{context}\n\n"
+            f"Question: {query}\nAnswer:"
+        )
+
+    def route(self, query: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[RouteResult]:
+        """`metadata` reaches the tool's run manager, as in an agent run (session_id, user_id)."""
+        result: Optional[RouteResult] = None
+        for name, tool_input, method in self._candidates(query):
+            output = str(self.tools[name].run(tool_input, metadata=metadata))
+            if _unhelpful(name, output):
+                continue
+            if name in SUMMARIZED_TOOLS and self.llm is not None:
+                output = str(self.llm.invoke(self._summarize_prompt(query, output))).strip()
+            result = RouteResult(name, output, method)
+            break
+        self.stats.record(result)
+        return result
+
+    async def aroute(self, query: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[RouteResult]:
+        result: Optional[RouteResult] = None
+        candidates = await asyncio.to_thread(self._candidates, query)
+        for name, tool_input, method in candidates:
+            output = str(await self.tools[name].arun(tool_input, metadata=metadata))  # pyright: ignore[reportUnknownMemberType]
+            if _unhelpful(name, output):
+                continue
+            if name in SUMMARIZED_TOOLS and self.llm is not None:
+                output = str(await self.llm.ainvoke(self._summarize_prompt(query, output))).strip()
+            result = RouteResult(name, output, method)
+            break
+        self.stats.record(result)
+        return result
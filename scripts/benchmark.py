@@ -0,0 +1,299 @@
+"""
+Offline benchmark suite.
+
+Ollama is replaced by a deterministic scripted LLM and DuckDuckGo by the stub search
+backend, so results depend only on the code and the machine. For each corpus size a
+synthetic corpus is generated from a fixed seed in a scratch workspace, and the suite
+measures:
+
+- ingestion throughput (`data.loader.ingest_documents`)
+- cold start of a fresh process: imports, tool construction, first agent turn
+- per-tool latency for every shared tool (distinct inputs, so caches stay cold)
+- full `agent.invoke` latency
+- peak RSS
+
+Each size runs in its own process, so its peak RSS isn't inherited from a larger one.
+
+Results are written as JSON (`--output`, default stdout) with the git commit, so runs can
+be compared across commits:
+
+    poetry run python -m scripts.benchmark --sizes 50 200 1000 --output bench.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)  # the workspace is the cwd, so the repo must be importable by path
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+
+SEED = 1234
+VOCABULARY = (
+    "parade fireworks harbor museum concert festival library market bridge river park "
+    "garden tram station ferry bakery stadium theater gallery castle lighthouse square "
+    "morning evening noon midnight monday friday saturday sunday july august summer winter "
+    "tickets schedule route parking weather tour guide map entrance exit closed open free "
+    "street avenue lane road north south east west old new grand little central harbour"
+).split()
+
+
+class ScriptedLLM(LLM):
+    """
+    A deterministic stand-in for Ollama that speaks the agent's ReAct format.
+
+    The first call for a question picks a tool from keywords in it; once an observation
+    is visible in the prompt (or the same prompt comes back), it gives a final answer.
+    Any other prompt (e.g. history summarization) gets a fixed short reply. `latency`
+    adds a sleep per call to model generation time.
+    """
+
+    latency: float = 0.0
+    calls: int = 0
+    seen: Dict[str, int] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return scripted_reply(prompt, self.seen)
+
+
+def scripted_reply(prompt: str, seen: Dict[str, int]) -> str:
+    """The scripted model's reply to `prompt`; `seen` counts prompts already answered."""
+    if "Action Input:" not in prompt:
+        return "The user asked a few questions about the city."
+
+    question = prompt.rsplit("Human: ", 1)[-1].split("\n", 1)[0].strip()
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    seen[key] = seen.get(key, 0) + 1
+    if seen[key] > 1 or "Observation:" in prompt.rsplit("Human: ", 1)[-1]:
+        return f"Thought: Do I need to use a tool? No\nFinal Answer: Here is what I found about {question}."
+    return f"Thought: Do I need to use a tool? Yes\nAction: {choose_tool(question)}\nAction Input: {question}"
+
+
+def choose_tool(question: str) -> str:
+    lowered = question.lower()
+    if re.fullmatch(r"[\d\s+\-*/().]+", question):
+        return "Calculator"
+    if "weather" in lowered or "today" in lowered:
+        return "WebSearch"
+    if lowered.startswith("my ") or " my " in lowered:
+        return "LongTermMemory"
+    return "Retriever"
+
+
+def make_corpus(folder: str, documents: int, rng: random.Random) -> None:
+    os.makedirs(folder, exist_ok=True)
+    for i in range(documents):
+        paragraphs = [
+            " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(40, 120))).capitalize() + "."
+            for _ in range(rng.randint(2, 6))
+        ]
+        with open(os.path.join(folder, f"doc_{i:05d}.txt"), "w") as f:
+            f.write("\n\n".join(paragraphs))
+
+
+def tool_input(name: str, i: int, rng: random.Random) -> str:
+    words = " ".join(rng.sample(VOCABULARY, 3))
+    return {
+        "Calculator": f"{i + 2} * 4 + {i}",
+        "python_repl": f"print(sum(range({i + 10})))",
+        "WebSearch": f"weather today {words}",
+        "LongTermMemory": f"what is my favorite {words}",
+    }.get(name, words)
+
+
+def agent_questions(count: int, rng: random.Random) -> List[str]:
+    templates = [
+        lambda: " ".join(rng.sample(VOCABULARY, 4)),
+        lambda: f"When does the {rng.choice(VOCABULARY)} {rng.choice(VOCABULARY)} open?",
+        lambda: f"{rng.randint(2, 99)} * {rng.randint(2, 99)} + {rng.randint(1, 9)}",
+        lambda: f"What is the weather today near the {rng.choice(VOCABULARY)}?",
+        lambda: f"What is my favorite {rng.choice(VOCABULARY)}?",
+    ]
+    return [templates[i % len(templates)]() for i in range(count)]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))] * 1000
+
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def stub_environment() -> None:
+    os.environ["CORTEX_SEARCH_BACKEND"] = "stub"
+    os.environ["CORTEX_LLM_CACHE"] = "0"
+
+
+def cold_start() -> Dict[str, float]:
+    """Runs in a fresh process (cwd = workspace): import, build the agent, answer one question."""
+    stub_environment()
+    started = time.perf_counter()
+    from agent import get_agent, get_shared_tools
+    imported = time.perf_counter()
+    shared_tools = get_shared_tools()
+    agent, _ = get_agent(shared_tools=shared_tools, llm=ScriptedLLM())
+    ready = time.perf_counter()
+    agent.invoke({"input": "When does the parade start?"})
+    answered = time.perf_counter()
+    return {
+        "import_s": imported - started,
+        "build_s": ready - imported,
+        "first_turn_s": answered - ready,
+        "total_s": answered - started,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_child(workspace: str, *arguments: str) -> Dict[str, Any]:
+    """Runs this script again in a fresh process in `workspace`; the child prints its result as the last line."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), *arguments],
+        cwd=workspace,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_size(documents: int, workspace: str, repeat: int, turns: int, workers: int) -> Dict[str, Any]:
+    """Runs in a fresh process (cwd = workspace), so peak RSS covers this corpus size alone."""
+    from data.loader import ingest_documents
+
+    rng = random.Random(SEED + documents)
+    make_corpus(os.path.join(workspace, "documents"), documents, rng)
+
+    stats = ingest_documents("documents", "vectorstore", workers=workers)
+    result: Dict[str, Any] = {
+        "documents": documents,
+        "ingest": {
+            "chunks": stats["chunks"],
+            "elapsed_s": stats["elapsed"],
+            "chunks_per_sec": stats["chunks_per_sec"],
+            "docs_per_sec": documents / stats["elapsed"] if stats["elapsed"] else 0.0,
+        },
+        "cold_start": run_child(workspace, "--cold-start-child"),
+    }
+
+    from agent import get_agent, get_shared_tools
+    shared_tools = get_shared_tools()
+    tools: Dict[str, Dict[str, float]] = {}
+    for tool in shared_tools:
+        inputs = iter([tool_input(tool.name, i, rng) for i in range(repeat + 1)])
+        tool.run(next(inputs))  # warm-up: lazy model loads, worker start-up
+        tools[tool.name] = timed(lambda: tool.run(next(inputs)), repeat)
+    result["tools"] = tools
+
+    agent, _ = get_agent(shared_tools=shared_tools, llm=ScriptedLLM())
+    questions = iter(agent_questions(turns + 1, rng))
+    agent.invoke({"input": next(questions)})
+    result["agent_invoke"] = timed(lambda: agent.invoke({"input": next(questions)}), turns)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of ingestion, tools and the agent.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000], help="Corpus sizes (documents).")
+    parser.add_argument("--repeat", type=int, default=20, help="Calls per tool.")
+    parser.add_argument("--turns", type=int, default=20, help="Agent turns per corpus size.")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding processes for ingestion.")
+    parser.add_argument("--output", default=None, help="Write JSON here instead of stdout.")
+    parser.add_argument("--cold-start-child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size-child", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_start_child:
+        print(json.dumps(cold_start()))
+        sys.exit(0)
+    if args.size_child is not None:
+        stub_environment()
+        print(json.dumps(bench_size(args.size_child, os.getcwd(), args.repeat, args.turns, args.workers)))
+        sys.exit(0)
+
+    stub_environment()
+    report: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": SEED,
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="cortex-bench-") as scratch:
+        for size in args.sizes:
+            workspace = os.path.join(scratch, f"corpus_{size}")
+            os.makedirs(workspace)
+            report["results"].append(run_child(
+                workspace,
+                "--size-child", str(size),
+                "--repeat", str(args.repeat),
+                "--turns", str(args.turns),
+                "--workers", str(args.workers),
+            ))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,287 @@
+"""
+Concurrent-session load generator.
+
+Runs N simulated conversations at once through the same path as the HTTP server
+(`server.SessionManager`, `server.ConcurrencyLimiter`, `main.respond`), for each
+concurrency level in turn. Ollama is replaced by a local fake Ollama HTTP server that
+streams scripted ReAct replies with a configurable per-token latency, and web search by
+the stub backend. Each session runs a scripted conversation covering math, retrieval,
+memory saving/recall and web search, under its own `user_id`.
+
+The fake server models how Ollama serves requests: `--parallel` slots generate at
+once (OLLAMA_NUM_PARALLEL) and the rest wait. Each slot keeps the prompt it evaluated
+last, and only the part of a new prompt past their common prefix costs
+`--prompt-token-latency` per token.
+
+For every level it reports turn throughput, p50/p95 turn latency, the queueing delay
+before a turn got a slot, rejected turns, and current/peak RSS:
+
+    poetry run python -m scripts.loadtest --concurrency 1 2 4 8 16 --turns 5 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple, cast
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)  # the workspace is the cwd, so the repo must be importable by path
+
+from scripts.benchmark import (
+    SEED,
+    VOCABULARY,
+    git_commit,
+    make_corpus,
+    peak_rss_mb,
+    scripted_reply,
+    stub_environment,
+    summarize,
+)
+
+NAMES = ["Alice", "Bruno", "Chen", "Dana", "Emil", "Farah", "Goran", "Hana"]
+CITIES = ["Boston", "Lisbon", "Osaka", "Denver", "Tallinn", "Quito"]
+
+
+class FakeOllama(ThreadingHTTPServer):
+    """
+    A local stand-in for the Ollama server answering `POST /api/generate` with streamed
+    scripted replies. Per-call prompt evaluation and generation times follow
+    `prompt_token_latency` and `token_latency`; tokens are approximated as 4 characters.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, token_latency: float, prompt_token_latency: float, parallel: int):
+        super().__init__(("127.0.0.1", 0), FakeOllamaHandler)
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.seen: Dict[str, int] = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._slots: List[str] = [""] * parallel  # last prompt evaluated by each slot
+        self._free = list(range(parallel))
+        self._available = threading.Condition(self._lock)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def acquire_slot(self, prompt: str) -> Tuple[int, int]:
+        """Waits for a free slot; prefers the one whose last prompt shares the longest prefix."""
+        with self._available:
+            while not self._free:
+                self._available.wait()
+            slot = max(self._free, key=lambda s: len(os.path.commonprefix([self._slots[s], prompt])))
+            self._free.remove(slot)
+            cached = len(os.path.commonprefix([self._slots[slot], prompt]))
+            self._slots[slot] = prompt
+            self.calls += 1
+        return slot, cached
+
+    def release_slot(self, slot: int) -> None:
+        with self._available:
+            self._free.append(slot)
+            self._available.notify()
+
+    def reply(self, prompt: str) -> str:
+        with self._lock:
+            return scripted_reply(prompt, self.seen)
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = str(body.get("prompt", ""))
+        server = cast(FakeOllama, self.server)
+
+        slot, cached_chars = server.acquire_slot(prompt)
+        try:
+            evaluated = (len(prompt) - cached_chars) // 4 + 1
+            prompt_eval = evaluated * server.prompt_token_latency
+            time.sleep(prompt_eval)
+            tokens = re.findall(r"\S+\s*", server.reply(prompt))
+            started = time.perf_counter()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            model = body.get("model", "mistral")
+            for token in tokens:
+                time.sleep(server.token_latency)
+                self._line({"model": model, "response": token, "done": False})
+            self._line({
+                "model": model,
+                "response": "",
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": evaluated,
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((time.perf_counter() - started) * 1e9),
+            })
+        finally:
+            server.release_slot(slot)
+
+    def _line(self, payload: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(payload).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+def conversation(turns: int, rng: random.Random) -> List[str]:
+    """A scripted conversation mixing fact saving, math, retrieval, web search and recall."""
+    name = rng.choice(NAMES)
+    script = [
+        f"My name is {name}",
+        f"What is {rng.randint(2, 99)} * {rng.randint(2, 99)} + {rng.randint(1, 9)}?",
+        f"When does the {rng.choice(VOCABULARY)} {rng.choice(VOCABULARY)} open?",
+        f"I live in {rng.choice(CITIES)}",
+        f"What is the weather today near the {rng.choice(VOCABULARY)}?",
+        "What is my name?",
+        " ".join(rng.sample(VOCABULARY, 4)),
+        "What is my home city?",
+    ]
+    return [script[i % len(script)] for i in range(turns)]
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()  # no procfs (macOS): the peak is the best available figure
+
+
+async def run_level(
+    manager: Any,
+    concurrency: int,
+    turns: int,
+    max_concurrent: int,
+    max_queued: int,
+    label: str = "load",
+) -> Dict[str, Any]:
+    from fastapi import HTTPException
+
+    from main import respond
+    from server import ConcurrencyLimiter
+
+    limiter = ConcurrencyLimiter(max_concurrent=max_concurrent, max_queued=max_queued)
+    rng = random.Random(f"{SEED}-{label}-{concurrency}")
+    scripts = [conversation(turns, rng) for _ in range(concurrency)]
+    latencies: List[float] = []
+    waits: List[float] = []
+    errors = 0
+
+    async def session(index: int, messages: List[str]) -> None:
+        nonlocal errors
+        session_id = f"{label}-{concurrency}-{index}"
+        state = manager.get(session_id, user_id=session_id)
+        for message in messages:
+            started = time.perf_counter()
+            try:
+                async with limiter.slot():
+                    waits.append(time.perf_counter() - started)
+                    async with state.lock:
+                        await respond(
+                            state.agent, state.memory, manager.fact_saver, message,
+                            session_id=session_id, router=state.router, user_id=state.user_id,
+                        )
+            except HTTPException:
+                continue  # rejected; counted by the limiter
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(i, messages) for i, messages in enumerate(scripts)))
+    elapsed = time.perf_counter() - started
+    for index in range(concurrency):
+        manager.drop(f"{label}-{concurrency}-{index}")
+
+    return {
+        "concurrency": concurrency,
+        "turns": concurrency * turns,
+        "completed": len(latencies),
+        "rejected": limiter.rejected,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": summarize(latencies) if latencies else {},
+        "queue_wait": summarize(waits) if waits else {},
+        "rss_mb": current_rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run(args: argparse.Namespace, fake: FakeOllama) -> List[Dict[str, Any]]:
+    from server import SessionManager
+
+    manager = await asyncio.to_thread(SessionManager)
+    try:
+        await run_level(manager, 1, 2, args.max_concurrency, args.max_queue, label="warmup")  # warm-up: model loads, worker start-up
+        results: List[Dict[str, Any]] = []
+        for level in args.concurrency:
+            calls = fake.calls
+            result = await run_level(manager, level, args.turns, args.max_concurrency, args.max_queue)
+            result["llm_calls"] = fake.calls - calls
+            results.append(result)
+        return results
+    finally:
+        await asyncio.to_thread(manager.fact_saver.close)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-session load test against a fake Ollama server.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Simultaneous sessions per level.")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session.")
+    parser.add_argument("--documents", type=int, default=100, help="Size of the synthetic retrieval corpus.")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds per generated token.")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.001, help="Seconds per uncached prompt token.")
+    parser.add_argument("--parallel", type=int, default=1, help="Requests the fake Ollama serves at once.")
+    parser.add_argument("--max-concurrency", type=int, default=int(os.getenv("CORTEX_MAX_CONCURRENCY", "4")))
+    parser.add_argument("--max-queue", type=int, default=int(os.getenv("CORTEX_MAX_QUEUE", "32")))
+    parser.add_argument("--output", default=None, help="Write JSON here instead of stdout.")
+    args = parser.parse_args()
+
+    stub_environment()
+    fake = FakeOllama(args.token_latency, args.prompt_token_latency, args.parallel)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+    os.environ["OLLAMA_HOST"] = fake.url
+
+    report: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "cpu_count": os.cpu_count(),
+        "seed": SEED,
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+    }
+    with tempfile.TemporaryDirectory(prefix="cortex-load-") as workspace:
+        from data.loader import ingest_documents
+
+        make_corpus(os.path.join(workspace, "documents"), args.documents, random.Random(SEED))
+        os.chdir(workspace)
+        ingest_documents("documents", "vectorstore")
+        report["results"] = asyncio.run(run(args, fake))
+        os.chdir(ROOT)
+    fake.shutdown()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
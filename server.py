@@ -0,0 +1,301 @@
+# server.py
+
+import asyncio
+import hmac
+import json
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.tools import BaseTool
+from pydantic import BaseModel
+from starlette.types import Receive, Scope, Send
+
+from agent import get_agent, get_shared_tools, load_llm
+from handlers.streaming import QueueStreamHandler
+from longterm_memory import DEFAULT_USER, LongTermMemory
+from main import respond
+from router import FastPathRouter, IntentClassifier, RoutingStats
+from tools.fact_saver import FactSaver
+from tools.repl_pool import drop_repl_session
+from tracing import get_tracer
+
+
+class ChatRequest(BaseModel):
+    session_id: str
+    message: str
+    user_id: Optional[str] = None  # long-term memory namespace; the default user when omitted
+
+
+class ChatResponse(BaseModel):
+    session_id: str
+    output: str
+
+
+class Session:
+    def __init__(
+        self, agent: Any, memory: BaseChatMemory, router: Optional[FastPathRouter], user_id: str = DEFAULT_USER,
+    ):
+        self.agent = agent
+        self.memory = memory
+        self.router = router
+        self.user_id = user_id  # set by the request that created the session
+        self.lock = asyncio.Lock()  # one turn at a time per conversation
+        self.last_used = time.monotonic()
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of agent turns running at once. Requests beyond the cap wait in a
+    bounded queue; once the queue is full, new requests are rejected with 503.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self.total_queue_wait = 0.0
+        self.completed = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncGenerator[None, None]:
+        if self._semaphore.locked() and self.queued >= self.max_queued:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy, try again later.")
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.total_queue_wait += time.monotonic() - started
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "avg_queue_wait": self.total_queue_wait / self.completed if self.completed else 0.0,
+        }
+
+
+class SessionManager:
+    """
+    Holds per-session agents and memory on top of one shared set of tools, vector
+    stores, embedding model and LLM client. Idle sessions are evicted after `idle_ttl`
+    seconds, and the least recently used one is dropped beyond `max_sessions`. Dropping a
+    session also frees its Python REPL namespace.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: float = 3600.0):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.longterm_store = LongTermMemory()
+        self.fact_saver = FactSaver(self.longterm_store)
+        self.shared_tools: List[BaseTool] = get_shared_tools(self.longterm_store)
+        self.llm = load_llm()
+        self.fast_path = os.getenv("CORTEX_FAST_PATH", "1") != "0"
+        self.intent_classifier = IntentClassifier()
+        self.routing_stats = RoutingStats()
+        self._sessions: Dict[str, Session] = {}
+
+    def get(self, session_id: str, user_id: str = DEFAULT_USER) -> Session:
+        """The session, created for `user_id` if it doesn't exist yet."""
+        self._evict_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            agent, memory = get_agent(shared_tools=self.shared_tools, llm=self.llm)
+            router = FastPathRouter(
+                agent.tools, llm=self.llm, classifier=self.intent_classifier, stats=self.routing_stats,
+            ) if self.fast_path else None
+            session = Session(agent, memory, router, user_id)
+            self._sessions[session_id] = session
+            if len(self._sessions) > self.max_sessions:
+                idle = [sid for sid, s in self._sessions.items() if sid != session_id and not s.lock.locked()]
+                if idle:
+                    self.drop(min(idle, key=lambda sid: self._sessions[sid].last_used))
+        session.last_used = time.monotonic()
+        return session
+
+    def drop(self, session_id: str) -> bool:
+        drop_repl_session(session_id)
+        return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_ttl
+        for sid in [sid for sid, s in self._sessions.items() if s.last_used < cutoff and not s.lock.locked()]:
+            self.drop(sid)
+
+
+sessions: Optional[SessionManager] = None
+limiter = ConcurrencyLimiter(
+    max_concurrent=int(os.getenv("CORTEX_MAX_CONCURRENCY", "4")),
+    max_queued=int(os.getenv("CORTEX_MAX_QUEUE", "32")),
+)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
+    global sessions
+    sessions = await asyncio.to_thread(
+        SessionManager,
+        int(os.getenv("CORTEX_MAX_SESSIONS", "1000")),
+        float(os.getenv("CORTEX_SESSION_TTL", "3600")),
+    )
+    yield
+    await asyncio.to_thread(sessions.fact_saver.close)
+
+
+app = FastAPI(title="Agent Cortex", lifespan=lifespan)
+
+
+def _sessions() -> SessionManager:
+    if sessions is None:
+        raise HTTPException(status_code=503, detail="Server is still starting.")
+    return sessions
+
+
+def _session(manager: SessionManager, request: ChatRequest) -> Session:
+    """The request's session. A session keeps the `user_id` it was created with, and other users get 403."""
+    user_id = request.user_id or DEFAULT_USER
+    session = manager.get(request.session_id, user_id)
+    if session.user_id != user_id:
+        raise HTTPException(status_code=403, detail="This session belongs to another user.")
+    return session
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest) -> ChatResponse:
+    manager = _sessions()
+    session = _session(manager, request)
+    async with limiter.slot(), session.lock:
+        response = await respond(
+            session.agent, session.memory, manager.fact_saver, request.message,
+            session_id=request.session_id, router=session.router, user_id=session.user_id,
+        )
+    return ChatResponse(session_id=request.session_id, output=response["output"])
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that holds a concurrency slot until the response is over, however
+    it ends: streamed to completion, failed, or the client gone before the body was read
+    (in which case the body generator never starts and its own cleanup never runs).
+    """
+
+    def __init__(self, content: AsyncIterator[str], slot: AsyncExitStack, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.slot.aclose()
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """Server-sent events: `token`, `tool` and `observation` while the agent runs, then `done` or `error`."""
+    manager = _sessions()
+    session = _session(manager, request)
+    slot = AsyncExitStack()
+    await slot.enter_async_context(limiter.slot())  # reject with 503 before the stream starts
+
+    async def events() -> AsyncIterator[str]:
+        handler = QueueStreamHandler()
+
+        async def run() -> Dict[str, Any]:
+            try:
+                async with session.lock:
+                    return await respond(
+                        session.agent, session.memory, manager.fact_saver, request.message,
+                        callbacks=[handler], session_id=request.session_id,
+                        router=session.router, user_id=session.user_id,
+                    )
+            finally:
+                await handler.close()
+
+        task = asyncio.create_task(run())
+        try:
+            while (item := await handler.queue.get()) is not None:
+                yield _sse(*item)
+            try:
+                result = await task
+                yield _sse("done", result["output"])
+            except Exception as e:
+                yield _sse("error", str(e))
+        finally:
+            if not task.done():
+                task.cancel()
+            await slot.aclose()  # release as soon as the turn is over; a no-op the second time
+
+    return SlotStreamingResponse(events(), slot, media_type="text/event-stream")
+
+
+@app.delete("/sessions/{session_id}")
+async def end_session(session_id: str) -> Dict[str, bool]:
+    return {"deleted": _sessions().drop(session_id)}
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Admits the request only if it carries the token configured in CORTEX_ADMIN_TOKEN."""
+    expected = os.getenv("CORTEX_ADMIN_TOKEN")
+    if not expected or x_admin_token is None or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=403, detail="A valid X-Admin-Token header is required.")
+
+
+@app.delete("/users/{user_id}/facts", dependencies=[Depends(require_admin)])
+async def delete_user_facts(user_id: str) -> Dict[str, int]:
+    """Deletes every long-term fact saved for `user_id`, including any still queued."""
+    manager = _sessions()
+    await asyncio.to_thread(manager.fact_saver.flush)
+    return {"deleted": await asyncio.to_thread(manager.longterm_store.delete_user, user_id)}
+
+
+@app.get("/health")
+async def health() -> Dict[str, Any]:
+    return {
+        "ready": sessions is not None,
+        "sessions": len(sessions) if sessions is not None else 0,
+        "concurrency": limiter.stats(),
+        "fact_queue_depth": sessions.fact_saver.queue_depth if sessions is not None else 0,
+        "routing": sessions.routing_stats.snapshot() if sessions is not None else {},
+        "latency": get_tracer().snapshot(),
+        "tokens": dict(get_tracer().tokens),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """Per-stage latency quantiles and LLM token counters in Prometheus text format."""
+    return get_tracer().prometheus()
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.getenv("CORTEX_HOST", "127.0.0.1"), port=int(os.getenv("CORTEX_PORT", "8000")))
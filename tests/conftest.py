@@ -0,0 +1,29 @@
+import hashlib
+from typing import List
+
+import pytest
+
+
+class HashEmbeddings:
+    """Deterministic bag-of-words embeddings, so stores can be exercised without downloading a model."""
+
+    def __init__(self, size: int = 64):
+        self.size = size
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.strip(".,?!").encode()).hexdigest(), 16) % self.size] += 1.0
+        norm = sum(x * x for x in vector) ** 0.5 or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+@pytest.fixture
+def embeddings() -> HashEmbeddings:
+    return HashEmbeddings()
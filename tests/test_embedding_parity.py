@@ -0,0 +1,45 @@
+from typing import List
+
+import pytest
+
+from data.loader import load_text_files
+from models.embedding_model import DEFAULT_MODEL_NAME, load_backend
+
+pytest.importorskip("onnxruntime")
+
+# Minimum cosine similarity with the torch embedding for every text.
+THRESHOLDS = {"onnx": 0.9999, "onnx-int8": 0.98}
+
+QUERIES = [
+    "Where is the parade?",
+    "What time do the fireworks start?",
+    "My name is Jacob",
+    "What's the weather like in Boston today?",
+]
+
+
+def encode(backend: str, texts: List[str]) -> List[List[float]]:
+    try:
+        encoder = load_backend(backend, DEFAULT_MODEL_NAME)
+    except OSError as e:  # the model can't be downloaded
+        pytest.skip(f"{DEFAULT_MODEL_NAME} is not available: {e}")
+    return encoder.encode(texts)
+
+
+@pytest.fixture(scope="module")
+def texts() -> List[str]:
+    return QUERIES + [text[:2000] for text in load_text_files()]
+
+
+@pytest.fixture(scope="module")
+def reference(texts: List[str]) -> List[List[float]]:
+    return encode("torch", texts)
+
+
+@pytest.mark.parametrize(("backend", "threshold"), THRESHOLDS.items())
+def test_backend_matches_torch(backend: str, threshold: float, texts: List[str], reference: List[List[float]]):
+    vectors = encode(backend, texts)
+
+    # All backends return unit vectors, so the dot product is the cosine similarity.
+    similarities = [sum(x * y for x, y in zip(a, b)) for a, b in zip(reference, vectors)]
+    assert min(similarities) >= threshold
@@ -0,0 +1,55 @@
+import json
+import os
+from pathlib import Path
+
+from data.lexical_index import LEGACY_LEXICAL_INDEX_NAME, LEXICAL_INDEX_NAME, LexicalIndex
+
+CHUNKS = {
+    "a": "The parade starts on Hope Street at ten",
+    "b": "Fireworks over the harbor after dark",
+    "c": "The parade route ends at the town common",
+}
+
+
+def build(path: Path) -> LexicalIndex:
+    index = LexicalIndex()
+    for doc_id, text in CHUNKS.items():
+        index.add(doc_id, text)
+    index.save(str(path))
+    return index
+
+
+def test_search_ranks_by_bm25_and_reports_coverage(tmp_path: Path):
+    index = build(tmp_path)
+
+    hits = index.search("Where is the parade on Hope Street?", k=2)
+
+    assert [doc_id for doc_id, _, _ in hits] == ["a", "c"]
+    assert hits[0][2] == 1.0 and hits[1][2] < 1.0
+    assert index.get_texts(["c", "missing", "a"]) == [CHUNKS["c"], "", CHUNKS["a"]]
+
+
+def test_loaded_index_is_updated_in_place(tmp_path: Path):
+    build(tmp_path)
+
+    index = LexicalIndex.load(str(tmp_path))
+    assert index is not None and len(index) == 3
+    index.remove("b")
+    index.add("d", "Carnival rides open at noon")
+    index.save(str(tmp_path))
+
+    reloaded = LexicalIndex.load(str(tmp_path))
+    assert reloaded is not None and len(reloaded) == 3
+    assert reloaded.search("fireworks") == []
+    assert [doc_id for doc_id, _, _ in reloaded.search("carnival noon")] == ["d"]
+
+
+def test_json_index_from_older_versions_is_converted(tmp_path: Path):
+    with open(tmp_path / LEGACY_LEXICAL_INDEX_NAME, "w") as f:
+        json.dump({"k1": 1.2, "b": 0.5, "postings": {}, "doc_lengths": {}, "texts": CHUNKS}, f)
+
+    index = LexicalIndex.load(str(tmp_path))
+
+    assert index is not None and (index.k1, index.b) == (1.2, 0.5)
+    assert [doc_id for doc_id, _, _ in index.search("harbor fireworks")] == ["b"]
+    assert os.listdir(tmp_path) == [LEXICAL_INDEX_NAME]
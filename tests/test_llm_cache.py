@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from langchain_core.outputs import Generation
+
+from conftest import HashEmbeddings
+from llm_cache import TOUCH_BATCH, PersistentLLMCache, cache_scope
+
+LLM = "ollama-mistral"
+
+
+def semantic_cache(path: Path, embeddings: HashEmbeddings) -> PersistentLLMCache:
+    return PersistentLLMCache(
+        str(path / "cache.sqlite3"), semantic=True, semantic_threshold=0.8,
+        embedding_model=embeddings,  # type: ignore[arg-type]
+    )
+
+
+def test_semantic_hits_stay_within_the_users_scope(tmp_path: Path, embeddings: HashEmbeddings):
+    cache = semantic_cache(tmp_path, embeddings)
+    with cache_scope("alice"):
+        cache.update("Human: what is my home city", LLM, [Generation(text="Boston")])
+
+    with cache_scope("alice"):
+        assert cache.lookup("Human: what is my home city?", LLM) == [Generation(text="Boston")]
+    with cache_scope("bob"):
+        assert cache.lookup("Human: what is my home city?", LLM) is None
+    assert cache.lookup("Human: what is my home city?", LLM) is None
+    assert cache.lookup("Human: what is my home city", LLM) == [Generation(text="Boston")]  # exact tier
+
+
+def test_unscoped_calls_store_no_semantic_entry(tmp_path: Path, embeddings: HashEmbeddings):
+    cache = semantic_cache(tmp_path, embeddings)
+    cache.update("Human: what is my home city", LLM, [Generation(text="Boston")])
+
+    with cache_scope("alice"):
+        assert cache.lookup("Human: what is my home city?", LLM) is None
+
+
+def test_hits_write_last_access_in_batches(tmp_path: Path):
+    cache = PersistentLLMCache(str(tmp_path / "cache.sqlite3"))
+    cache.update("prompt", LLM, [Generation(text="answer")])
+
+    def last_access() -> float:
+        return cache._conn.execute("SELECT last_access FROM llm_cache").fetchone()[0]  # pyright: ignore[reportPrivateUsage]
+
+    written = last_access()
+    for _ in range(TOUCH_BATCH - 1):
+        cache.lookup("prompt", LLM)
+    assert last_access() == written
+    cache.lookup("prompt", LLM)
+    assert last_access() > written
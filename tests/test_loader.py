@@ -0,0 +1,20 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from data.loader import MANIFEST_NAME, load_manifest, manifest_key
+
+
+def test_manifest_keys_are_real_paths(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "a.txt").write_text("hello")
+    (tmp_path / "store").mkdir()
+    (tmp_path / "store" / MANIFEST_NAME).write_text(json.dumps({"docs/a.txt": {"ids": ["x"]}}))
+
+    manifest = load_manifest("store")
+
+    assert list(manifest) == [os.path.realpath(tmp_path / "docs" / "a.txt")]
+    assert manifest_key("docs/a.txt") == manifest_key(str(tmp_path / "docs" / "a.txt"))
@@ -0,0 +1,94 @@
+import os
+from pathlib import Path
+from typing import Any, List
+
+import chromadb
+import pytest
+from chromadb import Collection
+
+from conftest import HashEmbeddings
+from data.numpy_store import LOG_NAME
+from longterm_memory import COLLECTION_NAME, DEFAULT_USER, LEGACY_COLLECTION_NAME, STAGING_COLLECTION_NAME, LongTermMemory
+
+
+def legacy_store(path: Path, embeddings: HashEmbeddings) -> None:
+    """A store as the original LongTermMemory wrote it: facts in the default collection, no metadata."""
+    text = "The user's name is Carol."
+    client = chromadb.PersistentClient(path=str(path))
+    client.create_collection(LEGACY_COLLECTION_NAME).add(
+        ids=["3f2a"], documents=[text], embeddings=[embeddings.embed_query(text)]
+    )
+
+
+def test_legacy_facts_are_searchable_without_compaction(tmp_path: Path, embeddings: HashEmbeddings):
+    legacy_store(tmp_path, embeddings)
+    store = LongTermMemory(str(tmp_path), backend="chroma")
+    store.embedding_model = embeddings  # type: ignore[assignment]
+
+    assert store.query("name") == ["The user's name is Carol."]
+    assert store.query("name", user_id=DEFAULT_USER) == ["The user's name is Carol."]
+    names = [c.name for c in chromadb.PersistentClient(path=str(tmp_path)).list_collections()]
+    assert names == [COLLECTION_NAME]
+
+
+def test_migrated_facts_upsert_like_new_ones(tmp_path: Path, embeddings: HashEmbeddings):
+    legacy_store(tmp_path, embeddings)
+    store = LongTermMemory(str(tmp_path), backend="chroma")
+    store.embedding_model = embeddings  # type: ignore[assignment]
+
+    store.save_fact("The user's name is Carol.")
+    assert store.vstore.get()["documents"] == ["The user's name is Carol."]
+
+
+def test_failed_migration_keeps_the_legacy_facts(tmp_path: Path, embeddings: HashEmbeddings, monkeypatch: pytest.MonkeyPatch):
+    texts = ["The user's name is Carol.", "The user lives in Boston."]
+    chromadb.PersistentClient(path=str(tmp_path)).create_collection(LEGACY_COLLECTION_NAME).add(
+        ids=["3f2a", "9c1b"], documents=texts, embeddings=[embeddings.embed_query(text) for text in texts]
+    )
+    add = Collection.add
+
+    def add_one_then_fail(self: Collection, ids: List[str], **kwargs: Any) -> None:
+        add(self, ids=ids[:1], **{key: value[:1] for key, value in kwargs.items()})
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(Collection, "add", add_one_then_fail)
+    store = LongTermMemory(str(tmp_path), backend="chroma")
+    store.embedding_model = embeddings  # type: ignore[assignment]
+    assert store.query("name") == []
+
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    assert sorted(c.name for c in client.list_collections()) == [LEGACY_COLLECTION_NAME, COLLECTION_NAME]
+    assert sorted(client.get_collection(LEGACY_COLLECTION_NAME).get()["documents"] or []) == sorted(texts)
+
+    monkeypatch.setattr(Collection, "add", add)
+    store = LongTermMemory(str(tmp_path), backend="chroma")
+    store.embedding_model = embeddings  # type: ignore[assignment]
+    assert store.query("name", k=2) == texts
+
+
+def test_rewrite_interrupted_after_the_copy_is_finished_on_open(tmp_path: Path, embeddings: HashEmbeddings):
+    legacy_store(tmp_path, embeddings)
+    text = "The user lives in Boston."
+    chromadb.PersistentClient(path=str(tmp_path)).create_collection(STAGING_COLLECTION_NAME).add(
+        ids=["default:9c1b"], documents=[text], metadatas=[{"user_id": DEFAULT_USER}],
+        embeddings=[embeddings.embed_query(text)],
+    )
+
+    store = LongTermMemory(str(tmp_path), backend="chroma")
+    store.embedding_model = embeddings  # type: ignore[assignment]
+
+    assert sorted(store.vstore.get()["documents"]) == ["The user lives in Boston.", "The user's name is Carol."]
+    names = [c.name for c in chromadb.PersistentClient(path=str(tmp_path)).list_collections()]
+    assert names == [COLLECTION_NAME]
+
+
+def test_compact_folds_the_numpy_log_into_the_export(tmp_path: Path, embeddings: HashEmbeddings):
+    store = LongTermMemory(str(tmp_path), backend="numpy", max_facts=1)
+    store.embedding_model = embeddings  # type: ignore[assignment]
+    store.save_fact("The user's name is Carol.", fact_type="name")
+    store.save_fact("The user lives in Boston.", fact_type="residence")
+    assert os.path.exists(tmp_path / LOG_NAME)
+
+    assert store.compact() == {"before": 2, "after": 1}
+    assert not os.path.exists(tmp_path / LOG_NAME)
+    assert store.query("where does the user live") == ["The user lives in Boston."]
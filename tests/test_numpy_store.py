@@ -0,0 +1,101 @@
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+from conftest import HashEmbeddings
+from data import numpy_store
+from data.numpy_store import LOG_NAME, META_NAME, VECTORS_NAME, NumpyVectorStore
+
+TEXTS = [
+    "The library opens at nine in the morning",
+    "Ferries to the island leave every hour",
+    "The museum is closed on Mondays",
+    "Bike rentals are available near the station",
+]
+
+
+def open_store(path: Path, embeddings: HashEmbeddings, **kwargs: Any) -> NumpyVectorStore:
+    return NumpyVectorStore(str(path), embeddings, **kwargs)  # type: ignore[arg-type]
+
+
+def make_store(path: Path, embeddings: HashEmbeddings, **kwargs: Any) -> NumpyVectorStore:
+    store = open_store(path, embeddings, index_keys=("user_id",), **kwargs)
+    store.add_texts(TEXTS, metadatas=[{"user_id": f"u{i % 2}", "rank": i} for i in range(len(TEXTS))])
+    return store
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_search_ranks_the_matching_text_first(tmp_path: Path, embeddings: HashEmbeddings, monkeypatch: pytest.MonkeyPatch, dtype: str):
+    monkeypatch.setattr(numpy_store, "COMPACT_MIN_ENTRIES", 0)  # search the exported matrix, not the log
+    store = make_store(tmp_path, embeddings, dtype=dtype)
+    assert np.load(os.path.join(tmp_path, VECTORS_NAME), mmap_mode="r").dtype == np.dtype(dtype)
+
+    hits = store.similarity_search_with_score("when is the museum closed", k=2)
+
+    assert hits[0][0].page_content == TEXTS[2]
+    assert len(hits) == 2 and hits[0][1] >= hits[1][1]
+
+
+def test_filters_use_the_index_and_range_operators(tmp_path: Path, embeddings: HashEmbeddings):
+    store = make_store(tmp_path, embeddings)
+
+    docs = store.similarity_search("the", k=10, filter={"$and": [{"user_id": "u1"}, {"rank": {"$gt": 1}}]})
+
+    assert [doc.page_content for doc in docs] == [TEXTS[3]]
+    assert store.get(where={"user_id": "u0"})["ids"] == ["0", "2"]
+
+
+def test_upserts_and_deletes_append_to_the_log(tmp_path: Path, embeddings: HashEmbeddings):
+    store = make_store(tmp_path, embeddings)
+    assert not os.path.exists(os.path.join(tmp_path, META_NAME))
+
+    store.add_texts(["The museum is open on Sundays"], metadatas=[{"user_id": "u0"}], ids=["2"])
+    store.delete(ids=["1"])
+
+    assert len(store) == 3
+    assert store.get(ids=["1", "2"])["documents"] == ["The museum is open on Sundays"]
+    assert "1" not in {doc.id for doc in store.similarity_search("ferries island", k=10)}
+
+    reopened = open_store(tmp_path, embeddings)
+    assert sorted(reopened.get()["ids"]) == ["0", "2", "3"]
+
+
+def test_log_is_compacted_into_the_export(tmp_path: Path, embeddings: HashEmbeddings, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(numpy_store, "COMPACT_MIN_ENTRIES", 4)
+    store = make_store(tmp_path, embeddings)
+
+    store.add_texts(["Trams run until midnight"], ids=["4"])
+
+    assert os.path.exists(os.path.join(tmp_path, META_NAME))
+    assert not os.path.exists(os.path.join(tmp_path, LOG_NAME))
+    assert sorted(open_store(tmp_path, embeddings).get()["ids"]) == ["0", "1", "2", "3", "4"]
+
+
+def test_writers_in_separate_stores_do_not_lose_updates(tmp_path: Path, embeddings: HashEmbeddings):
+    writers = [open_store(tmp_path, embeddings) for _ in range(4)]
+
+    def write(index: int, store: NumpyVectorStore) -> None:
+        for n in range(10):
+            store.add_texts([f"fact {index} {n}"], ids=[f"{index}-{n}"])
+
+    threads = [threading.Thread(target=write, args=(i, store)) for i, store in enumerate(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(open_store(tmp_path, embeddings)) == 40
+
+
+def test_a_torn_log_line_is_ignored(tmp_path: Path, embeddings: HashEmbeddings):
+    store = make_store(tmp_path, embeddings)
+    with open(os.path.join(tmp_path, LOG_NAME), "ab") as f:
+        f.write(b'{"delete": ["0"')
+
+    assert len(open_store(tmp_path, embeddings)) == 4
+    store.delete(ids=["3"])
+    assert sorted(open_store(tmp_path, embeddings).get()["ids"]) == ["0", "1", "2"]
@@ -0,0 +1,53 @@
+# pyright: reportUnknownMemberType=false
+
+import asyncio
+from types import ModuleType
+
+from langchain.tools import BaseTool
+
+from tools.calculator import CalculatorTool
+from tools.registry import LazyTool, SharedResources, ToolSpec, default_tool_specs, lazy_tools
+
+
+def calculator(module: ModuleType, resources: SharedResources) -> BaseTool:
+    return module.CalculatorTool()
+
+
+def test_prompt_fields_come_from_the_tool_class():
+    tool = LazyTool(ToolSpec("tools.calculator", "CalculatorTool", calculator), SharedResources())
+
+    assert tool.name == CalculatorTool.model_fields["name"].default
+    assert tool.description == CalculatorTool.model_fields["description"].default
+    assert tool.args_schema is CalculatorTool.model_fields["args_schema"].default
+    assert not tool.resolved
+
+
+def test_default_tools_are_not_built_up_front():
+    tools = lazy_tools(SharedResources())
+
+    assert [tool.name for tool in tools][-1] == "Fallback"
+    assert len(tools) == len(default_tool_specs())
+    assert not any(isinstance(tool, LazyTool) and tool.resolved for tool in tools)
+
+
+def test_calls_are_delegated_to_the_built_tool():
+    tool = LazyTool(ToolSpec("tools.calculator", "CalculatorTool", calculator), SharedResources())
+
+    assert tool.run("2 + 3") == CalculatorTool().run("2 + 3")
+    assert tool.resolved
+
+
+def test_build_failure_is_returned_as_the_observation():
+    attempts: list[int] = []
+
+    def broken(module: ModuleType, resources: SharedResources) -> BaseTool:
+        attempts.append(1)
+        raise ValueError("Vector store not found. You need to index documents first.")
+
+    tool = LazyTool(ToolSpec("tools.calculator", "CalculatorTool", broken), SharedResources())
+
+    assert tool.run("2 + 3") == (
+        "The Calculator tool is unavailable: Vector store not found. You need to index documents first."
+    )
+    assert "unavailable" in asyncio.run(tool.arun("2 + 3"))
+    assert len(attempts) == 2  # not cached; a later call can succeed once documents are indexed
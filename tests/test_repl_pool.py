@@ -0,0 +1,34 @@
+from typing import Generator
+
+import pytest
+
+from tools.repl_pool import REPLWorkerPool
+
+
+@pytest.fixture
+def pool() -> Generator[REPLWorkerPool, None, None]:
+    pool = REPLWorkerPool(workers=1, timeout=10.0, cpu_limit=1.0)
+    yield pool
+    pool.close()
+
+
+def test_workers_import_only_the_standard_library(pool: REPLWorkerPool):
+    assert pool.run("import sys\nprint('pytest' in sys.modules, 'math' in globals())") == "False True\n"
+
+
+def test_dropped_sessions_start_fresh(pool: REPLWorkerPool):
+    pool.run("x = 41", session_id="a")
+    assert pool.run("print(x + 1)", session_id="a") == "42\n"
+
+    pool.drop_session("a")
+
+    assert pool.run("print('x' in globals())", session_id="a") == "False\n"
+
+
+def test_worker_deaths_report_their_cause(pool: REPLWorkerPool):
+    assert pool.run("import os; os._exit(3)") == "RuntimeError('Execution was terminated: the worker exited with status 3.')"
+    assert pool.run("import os, signal; os.kill(os.getpid(), signal.SIGKILL)") == (
+        "RuntimeError('Execution was terminated: the worker was killed by SIGKILL.')"
+    )
+    assert pool.run("while True: pass") == "RuntimeError('Execution was terminated: CPU limit of 1s exceeded.')"
+    assert pool.run("print('still serving')") == "still serving\n"
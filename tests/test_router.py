@@ -0,0 +1,61 @@
+import asyncio
+from types import ModuleType, SimpleNamespace
+from typing import List, Tuple
+
+import pytest
+from langchain.tools import BaseTool
+from langchain_core.language_models import FakeListLLM
+
+from router import FastPathRouter
+from tools.registry import LazyTool, SharedResources, ToolSpec
+
+TOOLS = ["Calculator", "Reasoning", "LongTermMemory", "python_repl", "WebSearch"]
+
+
+def routes(query: str) -> List[Tuple[str, str]]:
+    router = FastPathRouter([SimpleNamespace(name=name) for name in TOOLS])  # type: ignore[misc]
+    return [(name, tool_input) for name, tool_input, _ in router._candidates(query)]  # pyright: ignore[reportPrivateUsage]
+
+
+@pytest.mark.parametrize("query", ["What is 2 + 3 * 4?", "2+2", "calculate (1.5 - 0.5) / 4"])
+def test_arithmetic_goes_to_the_calculator(query: str):
+    assert routes(query) == [("Calculator", query)]
+
+
+@pytest.mark.parametrize("query", ["What is 2023-12-25?", "12/25/2023", "what is 2024-1-5"])
+def test_dates_are_not_arithmetic(query: str):
+    assert routes(query) == []
+
+
+@pytest.mark.parametrize(
+    ("query", "code"),
+    [
+        ("sum([1, 2, 3])", "print(sum([1, 2, 3]))"),
+        ("math.sqrt(16)", "print(math.sqrt(16))"),
+        ("print(len('abc'))", "print(len('abc'))"),
+        ("`'a,b'.split(',')`", "print('a,b'.split(','))"),
+    ],
+)
+def test_code_goes_to_the_python_repl(query: str, code: str):
+    assert routes(query) == [("python_repl", code)]
+
+
+@pytest.mark.parametrize("query", ["help(me)", "parade(route)", "os.remove(x)", "'abc'.upper()"])
+def test_prose_that_parses_as_a_call_is_left_to_the_agent(query: str):
+    assert routes(query) == []
+
+
+def test_name_questions_try_reasoning_then_memory():
+    assert routes("Do you remember my name?") == [("Reasoning", "the user's name"), ("LongTermMemory", "the user's name")]
+
+
+def test_unavailable_tools_fall_through_to_the_agent():
+    def broken(module: ModuleType, resources: SharedResources) -> BaseTool:
+        raise ValueError("the long-term memory store could not be opened")
+
+    tool = LazyTool(ToolSpec("tools.longterm_memory", "LongTermMemoryTool", broken), SharedResources())
+    router = FastPathRouter([tool], llm=FakeListLLM(responses=["You told me your name is Jacob."]))
+
+    assert router.route("Do you remember my name?") is None
+    assert asyncio.run(router.aroute("Do you remember my name?")) is None
+    assert router.stats.snapshot()["fallthrough"] == 2
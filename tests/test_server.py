@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+from starlette.types import Message
+
+import server
+from server import ChatRequest, ConcurrencyLimiter, Session
+
+
+async def fake_respond(*args: Any, callbacks: List[Any], **kwargs: Any) -> Dict[str, Any]:
+    await callbacks[0].on_llm_new_token("Hello")
+    return {"output": "Hello there"}
+
+
+@pytest.fixture
+def limiter(monkeypatch: pytest.MonkeyPatch) -> ConcurrencyLimiter:
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=0)
+    created: Dict[str, Session] = {}
+
+    def get(session_id: str, user_id: str) -> Session:
+        return created.setdefault(session_id, Session(None, None, None, user_id))  # type: ignore[arg-type]
+
+    manager = SimpleNamespace(get=get, fact_saver=None)
+    monkeypatch.setattr(server, "limiter", limiter)
+    monkeypatch.setattr(server, "sessions", manager)
+    monkeypatch.setattr(server, "respond", fake_respond)
+    return limiter
+
+
+def test_streamed_turn_releases_its_slot(limiter: ConcurrencyLimiter):
+    client = TestClient(server.app)
+
+    response = client.post("/chat/stream", json={"session_id": "s", "message": "hi"})
+
+    assert 'event: token\ndata: "Hello"' in response.text
+    assert 'event: done\ndata: "Hello there"' in response.text
+    assert limiter.active == 0 and limiter.completed == 1
+
+
+def test_slot_is_released_when_the_client_leaves_before_the_body(limiter: ConcurrencyLimiter):
+    async def disconnect() -> None:
+        response = await server.chat_stream(ChatRequest(session_id="s", message="hi"))
+        assert limiter.active == 1
+
+        async def receive() -> Message:
+            return {"type": "http.disconnect"}
+
+        async def send(message: Message) -> None:
+            raise OSError("connection reset")
+
+        with pytest.raises(ClientDisconnect):
+            await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+
+        async with limiter.slot():  # would be rejected with 503 if the slot had leaked
+            pass
+
+    asyncio.run(disconnect())
+    assert limiter.active == 0 and limiter.rejected == 0
+
+
+def test_a_session_is_bound_to_the_user_that_created_it(limiter: ConcurrencyLimiter):
+    client = TestClient(server.app)
+    assert client.post("/chat/stream", json={"session_id": "s", "message": "hi", "user_id": "alice"}).status_code == 200
+
+    for path in ("/chat", "/chat/stream"):
+        for user in ({"user_id": "bob"}, {}):
+            response = client.post(path, json={"session_id": "s", "message": "what is my name?", **user})
+            assert response.status_code == 403
+    assert limiter.active == 0 and limiter.completed == 1
+
+
+@pytest.mark.parametrize(("configured", "sent"), [(None, None), (None, "secret"), ("secret", None), ("secret", "guess")])
+def test_deleting_facts_requires_the_admin_token(monkeypatch: pytest.MonkeyPatch, configured: Optional[str], sent: Optional[str]):
+    if configured is None:
+        monkeypatch.delenv("CORTEX_ADMIN_TOKEN", raising=False)
+    else:
+        monkeypatch.setenv("CORTEX_ADMIN_TOKEN", configured)
+    headers = {"X-Admin-Token": sent} if sent is not None else {}
+
+    response = TestClient(server.app).delete("/users/alice/facts", headers=headers)
+
+    assert response.status_code == 403
+
+
+def test_admin_can_delete_facts(monkeypatch: pytest.MonkeyPatch):
+    deleted: List[str] = []
+
+    def delete_user(user_id: str) -> int:
+        deleted.append(user_id)
+        return 2
+
+    manager = SimpleNamespace(fact_saver=SimpleNamespace(flush=lambda: None), longterm_store=SimpleNamespace(delete_user=delete_user))
+    monkeypatch.setattr(server, "sessions", manager)
+    monkeypatch.setenv("CORTEX_ADMIN_TOKEN", "secret")
+
+    response = TestClient(server.app).delete("/users/alice/facts", headers={"X-Admin-Token": "secret"})
+
+    assert response.json() == {"deleted": 2} and deleted == ["alice"]
@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, List
+
+from langchain_core.callbacks import AsyncCallbackManager, BaseCallbackHandler
+
+from tracing import Tracer, TracingCallbackHandler
+
+
+class CaptureHandler(BaseCallbackHandler):
+    def __init__(self):
+        self.events: List[str] = []
+
+    def on_llm_start(self, serialized: Any, prompts: List[str], **kwargs: Any) -> None:
+        self.events.append("llm_start")
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        self.events.append("llm_end")
+
+
+def test_async_llm_events_reach_other_handlers():
+    tracer = Tracer()
+    capture = CaptureHandler()
+    manager = AsyncCallbackManager(handlers=[TracingCallbackHandler(tracer), capture])
+
+    async def run() -> None:
+        from langchain_core.outputs import Generation, LLMResult
+
+        [run_manager] = await manager.on_llm_start({}, ["hello"])
+        await run_manager.on_llm_end(LLMResult(generations=[[Generation(text="hi")]]))
+
+    asyncio.run(run())
+    assert capture.events == ["llm_start", "llm_end"]
+    assert tracer.snapshot()["llm"]["count"] == 1
@@ -0,0 +1,29 @@
+from pathlib import Path
+from typing import List
+
+from cache import PersistentTTLCache
+from tools.websearch import SearchResult, StubSearchBackend, WebSearchTool
+
+
+def tool(path: Path, backend: StubSearchBackend) -> WebSearchTool:
+    return WebSearchTool(backend=backend, cache=PersistentTTLCache(str(path / "cache.sqlite3")))
+
+
+def test_results_are_cached(tmp_path: Path):
+    backend = StubSearchBackend()
+    search = tool(tmp_path, backend)
+
+    first = search.search("Boston weather")
+
+    assert search.search("boston  weather") == first and backend.calls == 1
+
+
+def test_empty_results_are_not_cached(tmp_path: Path):
+    empty: List[SearchResult] = []
+    backend = StubSearchBackend({"boston weather": empty})
+    search = tool(tmp_path, backend)
+
+    assert search.search("Boston weather") == "No results found."
+    backend.fixtures.clear()
+
+    assert search.search("Boston weather").startswith("[1] Result for Boston weather") and backend.calls == 2
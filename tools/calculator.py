@@ -17,8 +17,8 @@ class CalculatorTool(BaseTool):
         expression = input_text or str(kwargs.get("input_text", ""))
         return self.evaluate(expression)
 
-    async def _arun(self, *args: Any, **kwargs: Any) -> str:
-        raise NotImplementedError("Async not supported.")
+    async def _arun(self, input_text: Optional[str] = None, **kwargs: Dict[str, Any]) -> str:
+        return self._run(input_text, **kwargs)
 
     def evaluate(self, input_text: str) -> str:
         expression = self._extract_expression(input_text)
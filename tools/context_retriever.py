@@ -0,0 +1,147 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Type
+
+from langchain.tools import BaseTool
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from pydantic import BaseModel, Field, PrivateAttr
+
+from longterm_memory import DEFAULT_USER, LongTermMemory
+from tools.guarded_retriever import needs_realtime
+from tools.longterm_memory import current_user
+from tools.retriever import RetrieverTool
+
+SOURCE_MEMORY = "memory"
+SOURCE_DOCUMENTS = "documents"
+NO_CONTEXT_MESSAGE = "I couldn't find anything in long-term memory or the knowledge base."
+
+
+class ContextHit(NamedTuple):
+    text: str
+    source: str  # SOURCE_MEMORY or SOURCE_DOCUMENTS
+    score: float  # reciprocal-rank score within the merged list
+
+
+def merge_hits(ranked: Dict[str, List[str]], k: int = 60) -> List[ContextHit]:
+    """
+    Merges best-first result lists keyed by source with reciprocal-rank scoring.
+    A text found by several sources is kept once, credited to the source that ranked it highest.
+    """
+    hits: Dict[str, ContextHit] = {}
+    best_rank: Dict[str, int] = {}
+    for source, texts in ranked.items():
+        for rank, text in enumerate(dict.fromkeys(texts), 1):
+            score = 1.0 / (k + rank)
+            previous = hits.get(text)
+            if previous is None:
+                hits[text] = ContextHit(text, source, score)
+                best_rank[text] = rank
+            else:
+                if rank < best_rank[text]:
+                    best_rank[text] = rank
+                    previous = previous._replace(source=source)
+                hits[text] = previous._replace(score=previous.score + score)
+    return sorted(hits.values(), key=lambda hit: hit.score, reverse=True)
+
+
+class ContextRetrieverInput(BaseModel):
+    query: str = Field(description="What to look up in the user's saved facts and the knowledge base.")
+
+
+class ContextRetrieverTool(BaseTool):
+    """
+    Looks a query up in long-term memory and the document store in one tool call.
+
+    The two searches run concurrently and their results are merged with provenance. Each
+    store embeds the query only when it needs a vector (the document search answers exact
+    lexical matches without one), and concurrent requests to the shared embedding model
+    go out in one batch. As with the guarded retriever, the document search is skipped
+    for questions that need real-time data.
+    Facts are searched in the namespace of the `user_id` in the run metadata.
+    """
+
+    name: str = "Context"
+    description: str = (
+        "Use this to look something up in both the user's long-term facts and the knowledge base at once. "
+        "Input should be a query string."
+    )
+    args_schema: Type[BaseModel] = ContextRetrieverInput  # type: ignore
+
+    _retriever: RetrieverTool = PrivateAttr()
+    _memory_store: LongTermMemory = PrivateAttr()
+    _k_docs: int = PrivateAttr()
+    _k_facts: int = PrivateAttr()
+    _executor: ThreadPoolExecutor = PrivateAttr()
+
+    def __init__(
+        self,
+        retriever: RetrieverTool,
+        memory_store: LongTermMemory,
+        k_docs: int = 4,
+        k_facts: int = 3,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self._retriever = retriever
+        self._memory_store = memory_store
+        self._k_docs = k_docs
+        self._k_facts = k_facts
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-retriever")
+
+    def retrieve(self, query: str, user_id: str = DEFAULT_USER) -> List[ContextHit]:
+        facts = self._executor.submit(self._memory_store.query, query, self._k_facts, user_id)
+        docs = (
+            None if needs_realtime(query)
+            else self._executor.submit(self._retriever.query, query, self._k_docs)
+        )
+        return merge_hits({
+            SOURCE_MEMORY: facts.result(),
+            SOURCE_DOCUMENTS: docs.result() if docs is not None else [],
+        })
+
+    def retrieve_many(self, queries: List[str], user_id: str = DEFAULT_USER) -> List[List[ContextHit]]:
+        """`retrieve` for several queries: both batched searches run in parallel."""
+        searched = [q for q in queries if not needs_realtime(q)]
+        facts = self._executor.submit(self._memory_store.query_many, queries, self._k_facts, user_id)
+        docs = self._executor.submit(self._retriever.query_many, searched, self._k_docs)
+        found = iter(docs.result())
+        return [
+            merge_hits({SOURCE_MEMORY: q_facts, SOURCE_DOCUMENTS: [] if needs_realtime(q) else next(found)})
+            for q, q_facts in zip(queries, facts.result())
+        ]
+
+    def query_many(self, queries: List[str], user_id: str = DEFAULT_USER) -> List[str]:
+        """`_run` for several queries."""
+        return [self._format(hits) for hits in self.retrieve_many(queries, user_id)]
+
+    async def aretrieve(self, query: str, user_id: str = DEFAULT_USER) -> List[ContextHit]:
+        skip_docs = needs_realtime(query)
+        facts, docs = await asyncio.gather(
+            self._memory_store.aquery(query, self._k_facts, user_id=user_id),
+            self._retriever.aquery(query, self._k_docs) if not skip_docs else asyncio.sleep(0, result=[]),
+        )
+        return merge_hits({SOURCE_MEMORY: facts, SOURCE_DOCUMENTS: docs})
+
+    @staticmethod
+    def _format(hits: List[ContextHit]) -> str:
+        if not hits:
+            return NO_CONTEXT_MESSAGE
+        return "\n".join(f"[{hit.source}] {hit.text}" for hit in hits)
+
+    def _run(
+        self,
+        query: Optional[str] = None,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        **kwargs: Dict[str, Any],
+    ) -> str:
+        q = str(query or kwargs.get("query", ""))
+        return self._format(self.retrieve(q, current_user(run_manager)))
+
+    async def _arun(
+        self,
+        query: Optional[str] = None,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs: Dict[str, Any],
+    ) -> str:
+        q = str(query or kwargs.get("query", ""))
+        return self._format(await self.aretrieve(q, current_user(run_manager)))
@@ -1,29 +1,58 @@
 import re
-from longterm_memory import LongTermMemory
+from typing import List, Optional, Pattern, Tuple
+from longterm_memory import DEFAULT_USER, Fact, LongTermMemory, WriteBehindQueue
+from tracing import get_tracer
+
+# (pattern, fact type, template); each fact type keeps one current value per user.
+FACT_PATTERNS: List[Tuple[Pattern[str], str, str]] = [
+    (re.compile(r"\bmy name is ([A-Z][a-z]+)\b", re.IGNORECASE), "name", "The user's name is {fact}."),
+    (re.compile(r"\bi live in ([A-Za-z\s,]+)\b", re.IGNORECASE), "residence", "The user lives in {fact}."),
+    (re.compile(r"\bi am from ([A-Za-z\s,]+)\b", re.IGNORECASE), "origin", "The user is from {fact}."),
+]
 
 class FactSaver:
-    def __init__(self, memory_store: LongTermMemory):
+    def __init__(self, memory_store: LongTermMemory, write_behind: bool = True):
         self.memory_store = memory_store
+        self.queue: Optional[WriteBehindQueue] = WriteBehindQueue(memory_store) if write_behind else None
 
-    def maybe_save_fact(self, user_input: str) -> None:
-        # print(f"[LTM] User input: {user_input}")
+    def extract_facts(self, user_input: str, user_id: str = DEFAULT_USER) -> List[Fact]:
         """
-        Naively extract known fact types from user input and save them to long-term memory.
-        Extend this for names, locations, preferences, etc.
+        Naively extract known fact types from user input, as facts in `user_id`'s namespace.
+        Extend FACT_PATTERNS for names, locations, preferences, etc.
         """
         normalized = user_input.strip()
-
-        patterns = [
-            (r"\bmy name is ([A-Z][a-z]+)\b", "The user's name is {fact}."),
-            (r"\bi live in ([A-Za-z\s,]+)\b", "The user lives in {fact}."),
-            (r"\bi am from ([A-Za-z\s,]+)\b", "The user is from {fact}."),
-        ]
-
-        for pattern, template in patterns:
-            match = re.search(pattern, normalized, flags=re.IGNORECASE)
-            # print(f"[LTM] Template: {template}, Match: {match}")
+        facts: List[Fact] = []
+        for pattern, fact_type, template in FACT_PATTERNS:
+            match = pattern.search(normalized)
             if match:
-                fact = match.group(1).strip()
-                entry = template.format(fact=fact)
+                facts.append(Fact(template.format(fact=match.group(1).strip()), fact_type, user_id))
+        return facts
+
+    def maybe_save_fact(self, user_input: str, user_id: str = DEFAULT_USER) -> None:
+        """
+        Extract facts from user input and save them to long-term memory. With write-behind
+        enabled (the default) the facts are only queued here; a background thread embeds
+        and stores them in batches.
+        """
+        with get_tracer().span("fact_saver.extract") as span:
+            facts = self.extract_facts(user_input, user_id)
+            span["facts"] = len(facts)
+            for entry in facts:
                 # print(f"[LTM] Saving fact: {entry}")
-                self.memory_store.save_fact(entry)
+                if self.queue is not None:
+                    self.queue.put(entry)
+                else:
+                    self.memory_store.save_facts([entry])
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.depth if self.queue is not None else 0
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until queued facts are written (e.g. before deleting a user's facts)."""
+        return self.queue.flush(timeout) if self.queue is not None else True
+
+    def close(self) -> None:
+        """Flushes pending facts to the store; call on shutdown."""
+        if self.queue is not None:
+            self.queue.close()
@@ -13,5 +13,5 @@ class FallbackTool(BaseTool):
     def _run(self, query: Optional[str] = None, **kwargs: dict[str, Any]) -> str:
         return "I'm not sure how to help with that yet, but I'm still learning."
 
-    async def _arun(self, *args: Any, **kwargs: Any) -> str:
-        raise NotImplementedError("Async not supported.")
+    async def _arun(self, query: Optional[str] = None, **kwargs: dict[str, Any]) -> str:
+        return self._run(query, **kwargs)
@@ -1,9 +1,16 @@
-from typing import Any, Dict, Optional, Type
+from typing import Any, Dict, List, Optional, Type
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 
 from tools.retriever import RetrieverTool
 
+REALTIME_KEYWORDS = ["weather", "forecast", "temperature", "time", "today", "tomorrow"]
+REALTIME_SKIP_MESSAGE = "(Retriever skipped: question appears to require real-time data.)"
+
+
+def needs_realtime(query: str) -> bool:
+    return any(k in query.lower() for k in REALTIME_KEYWORDS)
+
 class GuardedRetrieverInput(BaseModel):
     query: str = Field(description="The knowledge base query.")
 
@@ -18,9 +25,22 @@ class GuardedRetrieverTool(BaseTool):
 
     def _run(self, query: Optional[str] = None, **kwargs: Dict[str, Any]) -> str:
         q = str(query or kwargs.get("query", ""))
-        if any(k in q.lower() for k in ["weather", "forecast", "temperature", "time", "today", "tomorrow"]):
-            return "(Retriever skipped: question appears to require real-time data.)"
+        if self._needs_realtime(q):
+            return REALTIME_SKIP_MESSAGE
         return "\n".join(self._retriever.query(q))
 
-    async def _arun(self, *args: Any, **kwargs: Any) -> str:
-        raise NotImplementedError("Async not supported.")
+    async def _arun(self, query: Optional[str] = None, **kwargs: Dict[str, Any]) -> str:
+        q = str(query or kwargs.get("query", ""))
+        if self._needs_realtime(q):
+            return REALTIME_SKIP_MESSAGE
+        return "\n".join(await self._retriever.aquery(q))
+
+    def query_many(self, queries: List[str]) -> List[str]:
+        """`_run` for several queries, with one batched retrieval for those not skipped."""
+        searched = [q for q in queries if not needs_realtime(q)]
+        found = iter(self._retriever.query_many(searched))
+        return [REALTIME_SKIP_MESSAGE if needs_realtime(q) else "\n".join(next(found)) for q in queries]
+
+    @staticmethod
+    def _needs_realtime(query: str) -> bool:
+        return needs_realtime(query)
@@ -1,7 +1,18 @@
 from langchain.tools import BaseTool
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
 from pydantic import BaseModel, Field, PrivateAttr
-from typing import Optional, Type, Any, Dict
-from longterm_memory import LongTermMemory
+from typing import List, Optional, Type, Any, Dict, Union
+from longterm_memory import DEFAULT_USER, LongTermMemory
+
+
+def current_user(
+    run_manager: Optional[Union[CallbackManagerForToolRun, AsyncCallbackManagerForToolRun]],
+) -> str:
+    """The `user_id` in the run metadata, whose long-term memory namespace a tool call may read."""
+    if run_manager is None:
+        return DEFAULT_USER
+    return str(run_manager.metadata.get("user_id", DEFAULT_USER))
+
 
 class LongTermMemoryInput(BaseModel):  # use LangChain’s v1 BaseModel if needed
     query: str = Field(description="Fact or question to retrieve from long-term memory")
@@ -14,14 +25,33 @@ class LongTermMemoryTool(BaseTool):
     _memory_store: LongTermMemory = PrivateAttr()
 
     def __init__(self, memory_store: LongTermMemory, **kwargs: Dict[str, Any]):
+        """Searches only the facts of the `user_id` given in the run metadata (default user otherwise)."""
         super().__init__(**kwargs)
         self._memory_store = memory_store
 
-    def _run(self, query: Optional[str] = None, **kwargs: Any) -> str:
+    def _run(
+        self,
+        query: Optional[str] = None,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        **kwargs: Any,
+    ) -> str:
         query_str = query if query is not None else str(kwargs.get("query", ""))
-        results = self._memory_store.query(query_str)
+        results = self._memory_store.query(query_str, user_id=current_user(run_manager))
         return "\n".join(results) if results else "I couldn't find anything in long-term memory."
 
-    async def _arun(self, *args: Any, **kwargs: Any) -> str:
-        raise NotImplementedError("Async not supported.")
+    def query_many(self, queries: List[str], user_id: str = DEFAULT_USER) -> List[str]:
+        """`_run` for several queries, with one batched lookup."""
+        return [
+            "\n".join(results) if results else "I couldn't find anything in long-term memory."
+            for results in self._memory_store.query_many(queries, user_id=user_id)
+        ]
 
+    async def _arun(
+        self,
+        query: Optional[str] = None,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        query_str = query if query is not None else str(kwargs.get("query", ""))
+        results = await self._memory_store.aquery(query_str, user_id=current_user(run_manager))
+        return "\n".join(results) if results else "I couldn't find anything in long-term memory."
@@ -1,7 +1,10 @@
+import asyncio
 from langchain.tools import BaseTool
-from langchain_experimental.utilities import PythonREPL
-from typing import Optional, Dict, Any, Type
-from pydantic import BaseModel, Field
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from typing import Optional, Dict, Any, Type, Union
+from pydantic import BaseModel, Field, PrivateAttr
+
+from tools.repl_pool import DEFAULT_SESSION, REPLWorkerPool, get_repl_pool
 
 class PythonREPLInput(BaseModel):
     code: str = Field(description="The Python code to execute")
@@ -11,12 +14,39 @@ class PythonREPLTool(BaseTool):
     description: str = "Executes Python code using a local REPL."
     args_schema: Type[BaseModel] = PythonREPLInput # type: ignore
 
-    def __init__(self, **kwargs: Any):
+    _pool: REPLWorkerPool = PrivateAttr()
+
+    def __init__(self, pool: Optional[REPLWorkerPool] = None, **kwargs: Any):
+        """
+        Code runs in an isolated, pre-warmed worker process with timeouts and memory
+        limits. Variables persist per conversation, keyed by the `session_id` in the
+        run's config metadata. Without a `pool`, the process-wide one is used.
+        """
         super().__init__(**kwargs)
-        self._repl = PythonREPL()
+        self._pool = pool or get_repl_pool()
+
+    @staticmethod
+    def _session_id(
+        run_manager: Optional[Union[CallbackManagerForToolRun, AsyncCallbackManagerForToolRun]],
+    ) -> str:
+        if run_manager is None:
+            return DEFAULT_SESSION
+        return str(run_manager.metadata.get("session_id", DEFAULT_SESSION))
 
-    def _run(self, code: Optional[str] = None, **kwargs: Dict[str, Any]) -> str:
-        return self._repl.run(code or str(kwargs.get("code", "")))
+    def _run(
+        self,
+        code: Optional[str] = None,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        **kwargs: Dict[str, Any],
+    ) -> str:
+        return self._pool.run(code or str(kwargs.get("code", "")), self._session_id(run_manager))
 
-    async def _arun(self, *args: Any, **kwargs: Any) -> str:
-        raise NotImplementedError("Async not supported.")
+    async def _arun(
+        self,
+        code: Optional[str] = None,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs: Dict[str, Any],
+    ) -> str:
+        return await asyncio.to_thread(
+            self._pool.run, code or str(kwargs.get("code", "")), self._session_id(run_manager)
+        )
@@ -37,5 +37,6 @@ class ReasoningTool(BaseTool):
             "but I couldn't find anything in memory."
         )
 
-    def _arun(self, *args, **kwargs): # type: ignore
-        raise NotImplementedError("Async not supported.")
+    async def _arun(self, question: Optional[str] = None, **kwargs) -> str: # type: ignore
+        """Asynchronous execution of the tool; scanning chat history is cheap, so it runs inline."""
+        return self._run(question, **kwargs) # type: ignore
@@ -0,0 +1,174 @@
+import asyncio
+import importlib
+import inspect
+import threading
+import time
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Callable, List, NamedTuple, Optional, Type
+
+from langchain.tools import BaseTool
+from langchain_core.tools import ToolException
+from pydantic import PrivateAttr
+
+if TYPE_CHECKING:
+    from longterm_memory import LongTermMemory
+    from tools.retriever import RetrieverTool
+
+
+# Start of the observation a lazy tool returns when it can't be built (format with `name`).
+TOOL_UNAVAILABLE = "The {name} tool is unavailable: "
+
+
+class SharedResources:
+    """
+    Stores that several tools share: one RetrieverTool (the knowledge base) and one
+    LongTermMemory. Each is imported and opened the first time a tool needs it.
+    """
+
+    def __init__(self, longterm_store: Optional["LongTermMemory"] = None):
+        self._longterm_store = longterm_store
+        self._retriever: Optional["RetrieverTool"] = None
+        self._lock = threading.Lock()
+
+    @property
+    def retriever(self) -> "RetrieverTool":
+        with self._lock:
+            if self._retriever is None:
+                from tools.retriever import RetrieverTool
+                self._retriever = RetrieverTool()
+            return self._retriever
+
+    @property
+    def longterm_store(self) -> "LongTermMemory":
+        with self._lock:
+            if self._longterm_store is None:
+                from longterm_memory import LongTermMemory
+                self._longterm_store = LongTermMemory()
+            return self._longterm_store
+
+
+Builder = Callable[[ModuleType, SharedResources], BaseTool]
+
+
+class ToolSpec(NamedTuple):
+    module: str
+    tool_class: str  # its `name`, `description` and `args_schema` defaults go into the prompt
+    build: Builder
+
+
+def _websearch(module: ModuleType, resources: SharedResources) -> BaseTool:
+    return module.WebSearchTool()
+
+
+def _python_repl(module: ModuleType, resources: SharedResources) -> BaseTool:
+    return module.PythonREPLTool()
+
+
+def _calculator(module: ModuleType, resources: SharedResources) -> BaseTool:
+    return module.CalculatorTool()
+
+
+def _retriever(module: ModuleType, resources: SharedResources) -> BaseTool:
+    return module.GuardedRetrieverTool(retriever=resources.retriever)
+
+
+def _longterm_memory(module: ModuleType, resources: SharedResources) -> BaseTool:
+    return module.LongTermMemoryTool(memory_store=resources.longterm_store)
+
+
+def _context(module: ModuleType, resources: SharedResources) -> BaseTool:
+    return module.ContextRetrieverTool(retriever=resources.retriever, memory_store=resources.longterm_store)
+
+
+def _fallback(module: ModuleType, resources: SharedResources) -> BaseTool:
+    return module.FallbackTool()
+
+
+def default_tool_specs() -> List[ToolSpec]:
+    """The shared tools, in prompt order (Fallback last)."""
+    return [
+        ToolSpec("tools.websearch", "WebSearchTool", _websearch),
+        ToolSpec("tools.python_REPL", "PythonREPLTool", _python_repl),
+        ToolSpec("tools.calculator", "CalculatorTool", _calculator),
+        ToolSpec("tools.guarded_retriever", "GuardedRetrieverTool", _retriever),
+        ToolSpec("tools.longterm_memory", "LongTermMemoryTool", _longterm_memory),
+        ToolSpec("tools.context_retriever", "ContextRetrieverTool", _context),
+        ToolSpec("tools.fallback", "FallbackTool", _fallback),
+    ]
+
+
+class LazyTool(BaseTool):
+    """
+    A placeholder with the real tool's name, description and input schema, read from
+    the tool class's field defaults. Tool modules keep their heavy imports inside the
+    code that opens stores and loads models, so importing them for this is cheap. The
+    tool itself (stores, models, worker processes) is constructed on first invocation
+    (or `resolve()`), and calls are then delegated to it.
+
+    If construction fails (e.g. no documents have been indexed yet), the call returns
+    the error as the tool's observation instead of failing the agent turn; the next
+    call tries again. Import and construction times are kept for startup profiling.
+    """
+
+    _spec: ToolSpec = PrivateAttr()
+    _resources: SharedResources = PrivateAttr()
+    _module: ModuleType = PrivateAttr()
+    _tool: Optional[BaseTool] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    import_seconds: Optional[float] = None
+    init_seconds: Optional[float] = None
+
+    def __init__(self, spec: ToolSpec, resources: SharedResources, **kwargs: Any):
+        started = time.perf_counter()
+        module = importlib.import_module(spec.module)
+        tool_class: Type[BaseTool] = getattr(module, spec.tool_class)
+        fields = tool_class.model_fields
+        super().__init__(
+            name=fields["name"].default,
+            description=fields["description"].default,
+            args_schema=fields["args_schema"].default,
+            handle_tool_error=True,
+            **kwargs,
+        )
+        self.import_seconds = time.perf_counter() - started
+        self._spec = spec
+        self._resources = resources
+        self._module = module
+
+    @property
+    def resolved(self) -> bool:
+        return self._tool is not None
+
+    def resolve(self) -> BaseTool:
+        if self._tool is None:
+            with self._lock:
+                if self._tool is None:
+                    started = time.perf_counter()
+                    tool = self._spec.build(self._module, self._resources)
+                    self.init_seconds = time.perf_counter() - started
+                    self._tool = tool
+        return self._tool
+
+    def _resolve_for_call(self) -> BaseTool:
+        try:
+            return self.resolve()
+        except Exception as e:
+            raise ToolException(f"{TOOL_UNAVAILABLE.format(name=self.name)}{e}") from e
+
+    @staticmethod
+    def _forward(method: Callable[..., Any], run_manager: Any, args: Any, kwargs: Any) -> Any:
+        # BaseTool only hands `run_manager` to tools whose `_run`/`_arun` declare it.
+        if run_manager is not None and "run_manager" in inspect.signature(method).parameters:
+            kwargs = {**kwargs, "run_manager": run_manager}
+        return method(*args, **kwargs)
+
+    def _run(self, *args: Any, run_manager: Any = None, **kwargs: Any) -> Any:
+        return self._forward(self._resolve_for_call()._run, run_manager, args, kwargs)
+
+    async def _arun(self, *args: Any, run_manager: Any = None, **kwargs: Any) -> Any:
+        tool = self._tool or await asyncio.to_thread(self._resolve_for_call)
+        return await self._forward(tool._arun, run_manager, args, kwargs)
+
+
+def lazy_tools(resources: SharedResources, specs: Optional[List[ToolSpec]] = None) -> List[BaseTool]:
+    return [LazyTool(spec, resources) for spec in (specs if specs is not None else default_tool_specs())]
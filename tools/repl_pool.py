@@ -0,0 +1,184 @@
+import atexit
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from multiprocessing.connection import Connection
+from typing import List, Optional, Tuple
+
+DEFAULT_PRELOAD: Tuple[str, ...] = (
+    "math", "statistics", "random", "json", "re", "datetime", "itertools", "collections",
+)
+DEFAULT_SESSION = "default"
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "repl_worker.py")
+
+
+class _Worker:
+    """A worker process running `repl_worker.py`, connected through an inherited socket."""
+
+    def __init__(self, preload: Tuple[str, ...], memory_limit_mb: Optional[int], cpu_limit: Optional[float]):
+        parent_sock, child_sock = socket.socketpair()
+        settings = {"preload": list(preload), "memory_limit_mb": memory_limit_mb, "cpu_limit": cpu_limit}
+        with child_sock:
+            self.process = subprocess.Popen(
+                [sys.executable, "-I", WORKER_SCRIPT, str(child_sock.fileno()), json.dumps(settings)],
+                pass_fds=(child_sock.fileno(),),
+            )
+        self.conn = Connection(parent_sock.detach())
+        self.cpu_limit = cpu_limit
+        self.runs = 0
+
+    def exit_cause(self) -> str:
+        """Why the worker stopped answering, from its exit status."""
+        try:
+            code = self.process.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            return "the worker closed its connection"
+        if code >= 0:
+            return f"the worker exited with status {code}"
+        if -code == signal.SIGXCPU:
+            return f"CPU limit of {self.cpu_limit:g}s exceeded"
+        try:
+            return f"the worker was killed by {signal.Signals(-code).name}"
+        except ValueError:
+            return f"the worker was killed by signal {-code}"
+
+    def stop(self) -> None:
+        try:
+            self.conn.close()
+        finally:
+            if self.process.poll() is None:
+                self.process.kill()
+            try:
+                self.process.wait(timeout=1.0)
+            except subprocess.TimeoutExpired:
+                pass
+
+
+class REPLWorkerPool:
+    """
+    A pool of pre-warmed worker processes for running untrusted Python snippets.
+
+    Each worker imports `preload` once at startup and keeps a separate globals namespace
+    per session; a session sticks to one worker so its variables persist between calls,
+    while different sessions run in parallel on different workers. Every call is bounded
+    by a wall-clock `timeout`, a per-call `cpu_limit` (seconds) and an address-space
+    `memory_limit_mb`. A worker that times out or dies is replaced immediately, and each
+    worker is recycled after `max_runs` calls (which resets the namespaces it held).
+    Workers are started from `repl_worker.py` alone rather than through multiprocessing,
+    which would re-import the parent's `__main__` (and the whole application) in each.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        timeout: float = 10.0,
+        cpu_limit: Optional[float] = 5.0,
+        memory_limit_mb: Optional[int] = 512,
+        max_runs: int = 200,
+        preload: Tuple[str, ...] = DEFAULT_PRELOAD,
+        max_sessions: int = 10_000,
+    ):
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.max_runs = max_runs
+        self.preload = preload
+        self.max_sessions = max_sessions
+        self._workers: List[_Worker] = [self._spawn() for _ in range(workers)]
+        self._slot_locks = [threading.Lock() for _ in range(workers)]
+        self._assignments: "OrderedDict[str, int]" = OrderedDict()
+        self._pending_drops: List[List[str]] = [[] for _ in range(workers)]  # sent before each worker's next run
+        self._assign_lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self.preload, self.memory_limit_mb, self.cpu_limit)
+
+    def _slot_for(self, session_id: str) -> int:
+        with self._assign_lock:
+            slot = self._assignments.get(session_id)
+            if slot is None:
+                load = [0] * len(self._workers)
+                for assigned in self._assignments.values():
+                    load[assigned] += 1
+                slot = load.index(min(load))
+                self._assignments[session_id] = slot
+                while len(self._assignments) > self.max_sessions:
+                    evicted, evicted_slot = self._assignments.popitem(last=False)
+                    self._pending_drops[evicted_slot].append(evicted)
+            self._assignments.move_to_end(session_id)
+            return slot
+
+    def _replace(self, slot: int) -> None:
+        self._workers[slot].stop()
+        self._workers[slot] = self._spawn()
+        with self._assign_lock:
+            self._pending_drops[slot] = []  # the new worker holds no namespaces
+
+    def run(self, code: str, session_id: str = DEFAULT_SESSION) -> str:
+        if self._closed:
+            raise RuntimeError("REPLWorkerPool is closed.")
+        slot = self._slot_for(session_id)
+        with self._slot_locks[slot]:
+            worker = self._workers[slot]
+            with self._assign_lock:
+                drops, self._pending_drops[slot] = self._pending_drops[slot], []
+            try:
+                for dropped in drops:
+                    worker.conn.send(("drop", dropped))
+                worker.conn.send(("run", session_id, code))
+                if not worker.conn.poll(self.timeout):
+                    self._replace(slot)
+                    return f"TimeoutError('Execution exceeded {self.timeout:g}s and was stopped.')"
+                output = worker.conn.recv()
+            except (EOFError, BrokenPipeError, ConnectionResetError):
+                cause = worker.exit_cause()
+                self._replace(slot)
+                return f"RuntimeError('Execution was terminated: {cause}.')"
+
+            worker.runs += 1
+            if worker.runs >= self.max_runs:
+                self._replace(slot)
+            return output
+
+    def drop_session(self, session_id: str) -> None:
+        """
+        Forgets a session's namespace. Never blocks on a running call: the drop is sent
+        before the worker's next run, and a worker replaced meanwhile has nothing to drop.
+        """
+        with self._assign_lock:
+            slot = self._assignments.pop(session_id, None)
+            if slot is not None:
+                self._pending_drops[slot].append(session_id)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self._workers:
+            worker.stop()
+
+
+_shared_pool: Optional[REPLWorkerPool] = None
+_shared_lock = threading.Lock()
+
+
+def get_repl_pool() -> REPLWorkerPool:
+    """The process-wide worker pool, started on first use."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = REPLWorkerPool()
+        return _shared_pool
+
+
+def drop_repl_session(session_id: str) -> None:
+    """Frees `session_id`'s namespace in the shared pool, if the pool was ever started."""
+    if _shared_pool is not None:
+        _shared_pool.drop_session(session_id)
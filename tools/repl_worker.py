@@ -0,0 +1,63 @@
+"""
+Entry point of a REPL worker process.
+
+`REPLWorkerPool` runs this file directly with `python -I`, so a worker starts from a bare
+interpreter: it imports only the standard library and the pool's preload modules, never
+the application that started it, and its memory limit applies to the worker alone.
+"""
+
+import importlib
+import io
+import json
+import resource
+import sys
+from contextlib import redirect_stdout
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Optional, Sequence
+
+
+def serve(conn: Connection, preload: Sequence[str], memory_limit_mb: Optional[int], cpu_limit: Optional[float]) -> None:
+    """Worker process loop: executes code in per-session namespaces and returns captured stdout."""
+    if memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    base_globals: Dict[str, Any] = {"__name__": "__main__"}
+    for name in preload:
+        try:
+            base_globals[name] = importlib.import_module(name)
+        except ImportError:
+            pass
+
+    namespaces: Dict[str, Dict[str, Any]] = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == "drop":
+            namespaces.pop(message[1], None)
+            continue
+
+        _, session_id, code = message
+        namespace = namespaces.setdefault(session_id, dict(base_globals))
+        if cpu_limit:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            soft = int(usage.ru_utime + usage.ru_stime + cpu_limit) + 1
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+        buffer = io.StringIO()
+        try:
+            with redirect_stdout(buffer):
+                exec(code, namespace)
+            conn.send(buffer.getvalue())
+        except Exception as e:
+            conn.send(repr(e))
+
+
+if __name__ == "__main__":
+    fd, settings = int(sys.argv[1]), json.loads(sys.argv[2])
+    serve(Connection(fd), settings["preload"], settings["memory_limit_mb"], settings["cpu_limit"])
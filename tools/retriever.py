@@ -1,12 +1,26 @@
-from typing import Any, Dict, Optional, Type
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, Optional, Type, Union
 from pydantic import BaseModel, Field, PrivateAttr
-from langchain_chroma import Chroma
 from langchain.docstore.document import Document
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.tools import BaseTool
+import threading
 import warnings
 import os
 
+from cache import TTLCache, bump_collection_version, collection_version, normalize_query
+from data.chunking import chunk_text
+from data.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from data.loader import MANIFEST_NAME
+from data.backend import batch_similarity_search, vector_backend, vector_dtype
+from models.embedding_model import EmbeddingModel, get_embedding_model
+from tracing import get_tracer
+
+if TYPE_CHECKING:
+    # Imported where the store is opened, so importing the tool (e.g. to read its
+    # description for the prompt) stays cheap.
+    from langchain_chroma import Chroma
+    from data.numpy_store import NumpyVectorStore
+
 
 class RetrieverInput(BaseModel):
     query: str = Field(description="The query to search in the vector store.")
@@ -14,10 +28,11 @@ class RetrieverInput(BaseModel):
 
 class RetrieverTool(BaseTool):
     """
-    A tool for performing semantic document retrieval using Chroma and Hugging Face embeddings.
+    A tool for performing semantic document retrieval using Chroma and the shared embedding model.
 
     This class supports:
-    - Loading an existing Chroma vector store from disk
+    - Loading an existing Chroma vector store from disk, or its memory-mapped numpy export
+      when `backend="numpy"` (default from CORTEX_VECTOR_BACKEND)
     - Querying the store for the most relevant documents based on a user input
     - Creating a new vector store from raw text documents via a static method
 
@@ -30,23 +45,48 @@ class RetrieverTool(BaseTool):
     args_schema: Type[BaseModel] = RetrieverInput # type: ignore
 
     _persist_directory: str = PrivateAttr()
-    _embedding_model: HuggingFaceEmbeddings = PrivateAttr()
-    _vstore: Chroma = PrivateAttr()
+    _embedding_model: EmbeddingModel = PrivateAttr()
+    _backend: str = PrivateAttr()
+    _vstore: Union["Chroma", "NumpyVectorStore"] = PrivateAttr()
+    _result_cache: TTLCache[list[str]] = PrivateAttr()
+    _lexical: Optional[LexicalIndex] = PrivateAttr()
+    _search_counts: dict[str, int] = PrivateAttr()
+    _counts_lock: threading.Lock = PrivateAttr()
 
 
-    def __init__(self, persist_directory: str = "vectorstore"):
+    def __init__(
+        self,
+        persist_directory: str = "vectorstore",
+        cache_size: int = 512,
+        cache_ttl: Optional[float] = 300.0,
+        backend: Optional[str] = None,
+    ):
         self._persist_directory = persist_directory
-        self._embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self._backend = backend or vector_backend()
+        self._embedding_model = get_embedding_model()
         self._vstore = self._load_vectorstore()
+        self._result_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._lexical = LexicalIndex.load(persist_directory)
+        self._search_counts = {"lexical_only": 0, "hybrid": 0}
+        self._counts_lock = threading.Lock()  # query_many runs on worker threads
+
+    def _load_vectorstore(self) -> Union["Chroma", "NumpyVectorStore"]:
+        if not os.path.exists(self._persist_directory):
+            raise ValueError("Vector store not found. You need to index documents first.")
+        if self._backend == "numpy":
+            from data.numpy_store import META_NAME, NumpyVectorStore
+
+            if os.path.exists(os.path.join(self._persist_directory, META_NAME)):
+                return NumpyVectorStore(self._persist_directory, self._embedding_model, dtype=vector_dtype())
+            # First use of the numpy backend: export the Chroma index next to it.
+            return NumpyVectorStore.from_chroma(self._persist_directory, self._embedding_model, dtype=vector_dtype())
+        else:
+            from langchain_chroma import Chroma
 
-    def _load_vectorstore(self):
-        if os.path.exists(self._persist_directory):
             return Chroma(
                 persist_directory=self._persist_directory,
                 embedding_function=self._embedding_model,
             )
-        else:
-            raise ValueError("Vector store not found. You need to index documents first.")
         
 
     def query_v1(self, query: str, k: int = 4) -> list[str]:
@@ -71,23 +111,90 @@ class RetrieverTool(BaseTool):
         docs = self._vstore.similarity_search(query, k=k)
         return [doc.page_content for doc in docs]
     
-    def query(self, query: str, k: int = 4) -> list[str]:
-        """FOR PROJECT ONLY, PRODUCTION WOULD REQUIRE USERS TO ENTER INFORMATION ABOUT DOCUMENTS THEY WILL USE RAG WITH"""
-        if "bristol" not in query.lower():
-            query = f"In the context of the July 4th celebrations in Bristol, Rhode Island: {query}"
-        docs = self._vstore.similarity_search(query, k=k)
-        return [doc.page_content for doc in docs]
+    def query(self, query: str, k: int = 4, fetch_k: int = 20) -> list[str]:
+        """
+        Hybrid retrieval over the BM25 lexical index and the dense vector store.
+
+        When every content term of the query occurs in the top lexical hit (street names,
+        dates, "Where is the parade?"), the lexical top-k is returned directly and no query
+        embedding is computed. Otherwise the top `fetch_k` lexical and dense results are
+        merged with reciprocal-rank fusion. Without a lexical index this is a plain dense
+        search.
+        """
+        return self.query_many([query], k=k, fetch_k=fetch_k)[0]
+
+    def query_many(self, queries: list[str], k: int = 4, fetch_k: int = 20) -> list[list[str]]:
+        """
+        `query` for several queries at once, returning one result list per query in order.
+
+        Cached and lexical-only queries are answered as in `query`; the rest are embedded
+        in one batched encode and searched with one batched vector-store call.
+        """
+        with get_tracer().span("retriever.query", k=k, queries=len(queries)) as span:
+            version = collection_version(self._persist_directory)
+            keys = [(normalize_query(q), k, fetch_k, version) for q in queries]
+            results: list[Optional[list[str]]] = [self._result_cache.get(key) for key in keys]
+            span["cached"] = sum(r is not None for r in results)
+
+            dense_rows: list[int] = []
+            lexical_ranked: dict[int, list[str]] = {}
+            lexical = self._lexical
+            for i, q in enumerate(queries):
+                if results[i] is not None:
+                    continue
+                if lexical is not None and (lexical_hits := lexical.search(q, k=fetch_k)):
+                    if lexical_hits[0][2] == 1.0:
+                        texts = lexical.get_texts([doc_id for doc_id, _, _ in lexical_hits[:k]])
+                        results[i] = texts
+                        self._count("lexical_only")
+                        self._result_cache.set(keys[i], texts)
+                        continue
+                    lexical_ranked[i] = lexical.get_texts([doc_id for doc_id, _, _ in lexical_hits])
+                dense_rows.append(i)
+
+            if dense_rows:
+                dense_k = fetch_k if lexical_ranked else k
+                vectors = self._embedding_model.embed_queries([queries[i] for i in dense_rows])
+                with get_tracer().span("vector_search.documents", k=dense_k, queries=len(dense_rows), backend=self._backend):
+                    dense_docs = batch_similarity_search(self._vstore, vectors, k=dense_k)
+                for i, docs in zip(dense_rows, dense_docs):
+                    dense = [doc.page_content for doc in docs]
+                    texts = reciprocal_rank_fusion([dense, lexical_ranked[i]])[:k] if i in lexical_ranked else dense[:k]
+                    results[i] = texts
+                    self._count("hybrid")
+                    self._result_cache.set(keys[i], texts)
+
+            return [list(r or []) for r in results]
+
+    def _count(self, kind: str) -> None:
+        with self._counts_lock:
+            self._search_counts[kind] += 1
+
+    async def aquery(self, query: str, k: int = 4) -> list[str]:
+        """Async `query`: the embedding forward pass and Chroma search run on a worker thread."""
+        return await asyncio.to_thread(self.query, query, k)
+
+    async def aquery_many(self, queries: list[str], k: int = 4) -> list[list[str]]:
+        return await asyncio.to_thread(self.query_many, queries, k)
+
+    def cache_stats(self) -> dict[str, dict[str, int]]:
+        """Hit/miss counters for the result cache and the shared query-embedding cache,
+        plus how many uncached queries were answered lexically vs. by hybrid search."""
+        with self._counts_lock:
+            search = dict(self._search_counts)
+        return {
+            "results": self._result_cache.stats(),
+            "query_embeddings": self._embedding_model.query_cache.stats(),
+            "search": search,
+        }
     
     def _run(self, query: Optional[str] = None, **kwargs: Dict[str, Any]) -> str:
         q = query or kwargs.get("query", "")
-        q = str(q)
-        if "bristol" not in q.lower():
-            q = f"In the context of the July 4th celebrations in Bristol, Rhode Island: {q}"
-        docs = self._vstore.similarity_search(q, k=4)
-        return "\n".join(doc.page_content for doc in docs)
+        return "\n".join(self.query(str(q)))
 
-    async def _arun(self, *args: Any, **kwargs: Any) -> str:
-        raise NotImplementedError("Async not supported.")
+    async def _arun(self, query: Optional[str] = None, **kwargs: Dict[str, Any]) -> str:
+        q = query or kwargs.get("query", "")
+        return "\n".join(await self.aquery(str(q)))
 
     
     @staticmethod
@@ -99,10 +206,15 @@ class RetrieverTool(BaseTool):
         Builds and saves a Chroma vector store from a list of raw text documents.
 
         This method:
-        - Converts each text string into a LangChain Document object
-        - Uses a SentenceTransformer embedding model to generate vector representations
+        - Splits each text string into token-bounded, overlapping chunks, each a LangChain
+          Document with its document index and character offsets as metadata
+        - Uses the shared SentenceTransformer embedding model to generate vector representations
         - Creates a Chroma vector store with those embeddings
-        - Persists the index to the specified directory on disk
+        - Persists the index to the specified directory on disk, with a BM25 lexical index
+          (and the numpy export when the numpy backend is configured)
+
+        Any existing index in `persist_directory` is replaced rather than appended to.
+        For incremental re-indexing of a folder, use `data.loader.ingest_documents`.
 
         Args:
             doc_texts (list[str]): A list of document strings to be indexed.
@@ -111,11 +223,38 @@ class RetrieverTool(BaseTool):
         Returns:
             None
         """
-        embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        documents: list[Document] = [Document(page_content=txt) for txt in doc_texts]
+        from langchain_chroma import Chroma
+
+        embedding_model = get_embedding_model()
+        if os.path.exists(persist_directory):
+            Chroma(
+                persist_directory=persist_directory,
+                embedding_function=embedding_model,
+            ).delete_collection()
+            manifest_path = os.path.join(persist_directory, MANIFEST_NAME)
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+        documents: list[Document] = []
+        ids: list[str] = []
+        lexical = LexicalIndex()
+        for i, txt in enumerate(doc_texts):
+            for j, chunk in enumerate(chunk_text(txt, embedding_model.tokenizer)):
+                ids.append(f"doc{i}:{j}")
+                documents.append(Document(
+                    page_content=chunk.text,
+                    metadata={"doc_index": i, "chunk": j, "start": chunk.start, "end": chunk.end},
+                ))
+                lexical.add(ids[-1], chunk.text)
         Chroma.from_documents( # type: ignore
             documents=documents,
             embedding=embedding_model,
+            ids=ids,
             persist_directory=persist_directory
         )
+        lexical.save(persist_directory)
+        if vector_backend() == "numpy":
+            from data.numpy_store import NumpyVectorStore
+
+            NumpyVectorStore.from_chroma(persist_directory, embedding_model, dtype=vector_dtype())
+        bump_collection_version(persist_directory)
         print(f"Vector store saved to `{persist_directory}`.")
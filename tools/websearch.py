@@ -1,63 +1,152 @@
-from typing import Optional, Dict, Any, Type, List
-from pydantic import BaseModel, Field
+import asyncio
+import os
+import threading
+from typing import Optional, Dict, Any, Type, List, Protocol
+from pydantic import BaseModel, Field, PrivateAttr
 from langchain.tools import BaseTool
-from duckduckgo_search import DDGS
 
+from cache import PersistentTTLCache, SingleFlight, normalize_query
+from tracing import get_tracer
 
-class WebSearchInput(BaseModel):
-    query: str = Field(description="The search query to look up on the internet.")
+SearchResult = Dict[str, str]  # {"title", "body", "href"}, as returned by DDGS.text
 
 
-class WebSearchTool(BaseTool):
-    name: str = "WebSearch"
-    description: str = "Search the internet using DuckDuckGo. Useful for retrieving current or factual information."
-    args_schema: Type[BaseModel] = WebSearchInput # type: ignore
+class SearchBackend(Protocol):
+    def search(self, query: str, max_results: int) -> List[SearchResult]: ...
 
-    def _run(self, query: Optional[str] = None, **kwargs: Dict[str, Any]) -> str:
-        q = query if query is not None else str(kwargs.get("query", ""))
-        return self.search(q)
 
+class DDGSBackend:
+    """DuckDuckGo search that keeps one DDGS client (and its HTTP session) per thread instead of one per call."""
 
-    async def _arun(self, *args: Any, **kwargs: Any) -> str:
-        raise NotImplementedError("Async not supported.")
+    def __init__(self):
+        self._local = threading.local()
 
-    def search(self, query: str, num_results: int = 3) -> str:
-        with DDGS() as ddgs:
-            results = ddgs.text(query, max_results=num_results)
-            formatted: List[str] = []
-            for i, result in enumerate(results, 1):
-                title = result.get("title", "")
-                snippet = result.get("body", "")
-                url = result.get("href", "")
-                formatted.append(f"[{i}] {title}\n{snippet}\n{url}\n")
-            return "\n\n".join(formatted) if formatted else "No results found."
+    def search(self, query: str, max_results: int) -> List[SearchResult]:
+        ddgs = getattr(self._local, "ddgs", None)
+        if ddgs is None:
+            from duckduckgo_search import DDGS
+            ddgs = DDGS()
+            self._local.ddgs = ddgs
+        return list(ddgs.text(query, max_results=max_results))
 
 
+class HTTPSearchBackend:
+    """
+    Queries a search service at `base_url` over one reused HTTP connection pool; e.g. a
+    local fixture server for offline tests. Expects `GET {base_url}/search?q=...&max_results=N`
+    to return a JSON list of {"title", "body", "href"} objects.
+    """
 
+    def __init__(self, base_url: str, timeout: float = 10.0):
+        import httpx
+        self._client = httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout)
 
+    def search(self, query: str, max_results: int) -> List[SearchResult]:
+        response = self._client.get("/search", params={"q": query, "max_results": max_results})
+        response.raise_for_status()
+        return response.json()
 
 
+class StubSearchBackend:
+    """Deterministic offline backend: canned results per normalized query, or a generic result."""
 
-# from duckduckgo_search import DDGS
-# from langchain.tools import BaseTool
+    def __init__(self, fixtures: Optional[Dict[str, List[SearchResult]]] = None):
+        self.fixtures = {normalize_query(q): r for q, r in (fixtures or {}).items()}
+        self.calls = 0
 
-# class WebSearchTool(BaseTool):
-#     """
-#     A tool for performing live internet search using DuckDuckGo.
+    def search(self, query: str, max_results: int) -> List[SearchResult]:
+        self.calls += 1
+        results = self.fixtures.get(normalize_query(query))
+        if results is None:
+            results = [{
+                "title": f"Result for {query}",
+                "body": f"Stub search result for '{query}'.",
+                "href": "http://localhost/stub",
+            }]
+        return results[:max_results]
 
-#     Returns the top few search result snippets or URLs.
-#     """
 
-#     def search(self, query: str, num_results: int = 3) -> str:
-#         with DDGS() as ddgs:
-#             results = ddgs.text(query, max_results=num_results)
-#             from typing import List
-#             formatted: List[str] = []
+def backend_from_env() -> SearchBackend:
+    """CORTEX_SEARCH_BACKEND: "ddg" (default), "stub", or the base URL of an HTTP search service."""
+    choice = os.getenv("CORTEX_SEARCH_BACKEND", "ddg")
+    if choice == "stub":
+        return StubSearchBackend()
+    if choice.startswith(("http://", "https://")):
+        return HTTPSearchBackend(choice)
+    return DDGSBackend()
 
-#             for i, result in enumerate(results, 1):
-#                 title = result.get("title", "")
-#                 snippet = result.get("body", "")
-#                 url = result.get("href", "")
-#                 formatted.append(f"[{i}] {title}\n{snippet}\n{url}\n")
 
-#             return "\n\n".join(formatted) if formatted else "No results found."
\ No newline at end of file
+class WebSearchInput(BaseModel):
+    query: str = Field(description="The search query to look up on the internet.")
+
+
+class WebSearchTool(BaseTool):
+    name: str = "WebSearch"
+    description: str = "Search the internet using DuckDuckGo. Useful for retrieving current or factual information."
+    args_schema: Type[BaseModel] = WebSearchInput # type: ignore
+
+    _backend: SearchBackend = PrivateAttr()
+    _cache: Optional[PersistentTTLCache] = PrivateAttr()
+    _flight: SingleFlight[List[SearchResult]] = PrivateAttr()
+
+    def __init__(
+        self,
+        backend: Optional[SearchBackend] = None,
+        cache: Optional[PersistentTTLCache] = None,
+        use_cache: bool = True,
+        **kwargs: Any,
+    ):
+        """
+        Results are cached on disk by normalized query (TTL from CORTEX_SEARCH_CACHE_TTL,
+        default 15 minutes; empty results are not cached), and identical searches already in flight are coalesced into
+        a single backend request.
+        """
+        super().__init__(**kwargs)
+        self._backend = backend or backend_from_env()
+        if cache is None and use_cache:
+            cache = PersistentTTLCache(
+                os.getenv("CORTEX_SEARCH_CACHE_PATH", "search_cache/cache.sqlite3"),
+                ttl=float(os.getenv("CORTEX_SEARCH_CACHE_TTL", "900")),
+            )
+        self._cache = cache
+        self._flight = SingleFlight()
+
+    def _run(self, query: Optional[str] = None, **kwargs: Dict[str, Any]) -> str:
+        q = query if query is not None else str(kwargs.get("query", ""))
+        return self.search(q)
+
+
+    async def _arun(self, query: Optional[str] = None, **kwargs: Dict[str, Any]) -> str:
+        q = query if query is not None else str(kwargs.get("query", ""))
+        return await self.asearch(q)
+
+    async def asearch(self, query: str, num_results: int = 3) -> str:
+        """Runs `search` on a worker thread so the event loop isn't blocked on the HTTP round trip."""
+        return await asyncio.to_thread(self.search, query, num_results)
+
+    def search(self, query: str, num_results: int = 3) -> str:
+        key = f"{num_results}:{normalize_query(query)}"
+        with get_tracer().span("websearch.search") as span:
+            results = self._cache.get(key) if self._cache is not None else None
+            span["cached"] = results is not None
+            if results is None:
+                results = self._flight.do(key, lambda: self._fetch(key, query, num_results))
+
+        formatted: List[str] = []
+        for i, result in enumerate(results, 1):
+            title = result.get("title", "")
+            snippet = result.get("body", "")
+            url = result.get("href", "")
+            formatted.append(f"[{i}] {title}\n{snippet}\n{url}\n")
+        return "\n\n".join(formatted) if formatted else "No results found."
+
+    def _fetch(self, key: str, query: str, num_results: int) -> List[SearchResult]:
+        with get_tracer().span("websearch.fetch", backend=type(self._backend).__name__):
+            results = self._backend.search(query, num_results)
+        if results and self._cache is not None:  # an empty page is often transient; ask again next time
+            self._cache.set(key, results)
+        return results
+
+    def cache_stats(self) -> Dict[str, int]:
+        stats = self._cache.stats() if self._cache is not None else {}
+        return {**stats, "coalesced": self._flight.coalesced}
@@ -0,0 +1,299 @@
+# tracing.py
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Generator, List, Optional, cast
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from data.chunking import approx_tokens
+
+QUANTILES = (0.5, 0.95, 0.99)
+# "prompt" counts prompt tokens the model evaluated; "prompt_cached" those served from
+# its cached context instead.
+TOKEN_TYPES = ("prompt", "prompt_cached", "completion")
+
+
+class StageStats:
+    """Latency samples for one stage: exact count/sum plus a window of recent samples for quantiles."""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, duration: float, error: bool) -> None:
+        self.count += 1
+        self.total += duration
+        self.errors += int(error)
+        self.samples.append(duration)
+
+    def quantiles(self) -> Dict[float, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class Tracer:
+    """
+    Records timed spans for each stage of a turn (LLM calls, tool runs, embedding batches,
+    vector searches, ...) and aggregates them per stage into latency quantiles.
+
+    Every span is also appended as one JSON line to `jsonl_path` when set. `snapshot()`
+    returns the aggregates as a dict; `prometheus()` renders them in the Prometheus text
+    exposition format. A disabled tracer records nothing.
+    """
+
+    def __init__(self, enabled: bool = True, jsonl_path: Optional[str] = None, window: int = 10_000):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.window = window
+        self.tokens: Dict[str, int] = dict.fromkeys(TOKEN_TYPES, 0)
+        self._stages: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+        self._file: Any = None
+        if jsonl_path:
+            directory = os.path.dirname(jsonl_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(jsonl_path, "a", buffering=1)
+
+    @contextmanager
+    def span(self, stage: str, **attrs: Any) -> Generator[Dict[str, Any], None, None]:
+        """Times the enclosed block as `stage`. The yielded dict can be filled with more attributes."""
+        if not self.enabled:
+            yield attrs
+            return
+        started = time.time()
+        t0 = time.perf_counter()
+        error = False
+        try:
+            yield attrs
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - t0, started=started, error=error, **attrs)
+
+    def record(
+        self,
+        stage: str,
+        duration: float,
+        started: Optional[float] = None,
+        error: bool = False,
+        **attrs: Any,
+    ) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats(self.window)
+            stats.add(duration, error)
+            if self._file is not None:
+                self._file.write(json.dumps({
+                    "stage": stage,
+                    "start": started if started is not None else time.time() - duration,
+                    "duration_ms": duration * 1000,
+                    "error": error,
+                    **attrs,
+                }, default=str) + "\n")
+
+    def count_tokens(self, prompt: int, completion: int, prompt_cached: int = 0) -> None:
+        with self._lock:
+            self.tokens["prompt"] += prompt
+            self.tokens["prompt_cached"] += prompt_cached
+            self.tokens["completion"] += completion
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stages = {name: (s.count, s.total, s.errors, s.quantiles()) for name, s in self._stages.items()}
+        return {
+            name: {
+                "count": count,
+                "errors": errors,
+                "mean_ms": total / count * 1000 if count else 0.0,
+                **{f"p{round(q * 100)}_ms": value * 1000 for q, value in quantiles.items()},
+            }
+            for name, (count, total, errors, quantiles) in sorted(stages.items())
+        }
+
+    def prometheus(self) -> str:
+        lines: List[str] = [
+            "# HELP cortex_stage_latency_seconds Latency of each agent stage.",
+            "# TYPE cortex_stage_latency_seconds summary",
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for name, stats in stages:
+                for q, value in stats.quantiles().items():
+                    lines.append(f'cortex_stage_latency_seconds{{stage="{name}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'cortex_stage_latency_seconds_sum{{stage="{name}"}} {stats.total:.6f}')
+                lines.append(f'cortex_stage_latency_seconds_count{{stage="{name}"}} {stats.count}')
+            lines += [
+                "# HELP cortex_stage_errors_total Spans that ended in an exception.",
+                "# TYPE cortex_stage_errors_total counter",
+            ]
+            lines += [f'cortex_stage_errors_total{{stage="{name}"}} {stats.errors}' for name, stats in stages]
+            lines += [
+                "# HELP cortex_llm_tokens_total LLM tokens processed (prompt: evaluated, prompt_cached: reused from cache).",
+                "# TYPE cortex_llm_tokens_total counter",
+            ]
+            lines += [f'cortex_llm_tokens_total{{type="{kind}"}} {count}' for kind, count in self.tokens.items()]
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self.tokens = dict.fromkeys(TOKEN_TYPES, 0)
+
+
+def _token_counts(response: LLMResult, prompt_estimate: int = 0) -> Dict[str, float]:
+    """
+    Token counts from OpenAI-style `token_usage` or Ollama's generation info, split into
+    evaluated prompt tokens, cached prompt tokens and completion tokens.
+
+    Ollama's `prompt_eval_count` only covers the part of the prompt it had to evaluate
+    (it is left out entirely when the whole prompt was cached) and it does not report the
+    cached part, so that is estimated as `prompt_estimate` minus the evaluated count.
+    """
+    llm_output = cast(Dict[str, Any], response.llm_output or {})  # pyright: ignore[reportUnknownMemberType]
+    usage: Dict[str, Any] = llm_output.get("token_usage") or {}
+    if usage:
+        details: Dict[str, Any] = usage.get("prompt_tokens_details") or {}
+        cached = int(details.get("cached_tokens") or 0)
+        return {
+            "prompt": int(usage.get("prompt_tokens", 0)) - cached,
+            "prompt_cached": cached,
+            "completion": int(usage.get("completion_tokens", 0)),
+            "prompt_eval_ms": 0.0,
+        }
+    counts: Dict[str, float] = {"prompt": 0, "prompt_cached": 0, "completion": 0, "prompt_eval_ms": 0.0}
+    reported = False
+    for generations in response.generations:
+        for generation in generations:
+            info = generation.generation_info or {}
+            reported = reported or "eval_count" in info
+            counts["prompt"] += int(info.get("prompt_eval_count") or 0)
+            counts["completion"] += int(info.get("eval_count") or 0)
+            counts["prompt_eval_ms"] += int(info.get("prompt_eval_duration") or 0) / 1e6
+    if reported:
+        counts["prompt_cached"] = max(0, prompt_estimate - int(counts["prompt"]))
+    return counts
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Turns LangChain run events into tracer spans: `llm` (with evaluated, cached and
+    completion token counts and prompt-evaluation time), `tool.<name>` and `agent`
+    (top-level chain runs). Attach it to the LLM, the tools and the executor.
+
+    It must not set `run_inline`: async callback managers then dispatch `on_llm_start`
+    to the inline handlers only, and the per-request handlers (streaming) never see it.
+    """
+
+    def __init__(self, tracer: "Tracer"):
+        self.tracer = tracer
+        self._starts: Dict[UUID, tuple[str, float, float]] = {}
+        self._prompt_estimates: Dict[UUID, int] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, stage: str) -> None:
+        with self._lock:
+            self._starts[run_id] = (stage, time.time(), time.perf_counter())
+
+    def _end(self, run_id: UUID, error: bool = False, **attrs: Any) -> None:
+        with self._lock:
+            entry = self._starts.pop(run_id, None)
+        if entry is not None:
+            stage, started, t0 = entry
+            self.tracer.record(stage, time.perf_counter() - t0, started=started, error=error, **attrs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._prompt_estimates[run_id] = sum(approx_tokens(prompt) for prompt in prompts)
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            estimate = self._prompt_estimates.pop(run_id, 0)
+        tokens = _token_counts(response, estimate)
+        prompt, cached, completion = int(tokens["prompt"]), int(tokens["prompt_cached"]), int(tokens["completion"])
+        self.tracer.count_tokens(prompt, completion, prompt_cached=cached)
+        self._end(
+            run_id,
+            prompt_tokens=prompt,
+            cached_prompt_tokens=cached,
+            completion_tokens=completion,
+            prompt_eval_ms=tokens["prompt_eval_ms"],
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._prompt_estimates.pop(run_id, None)
+        self._end(run_id, error=True)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, f"tool.{serialized.get('name', 'tool')}")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=True)
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        if parent_run_id is None:
+            self._start(run_id, "agent")
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=True)
+
+
+_shared_tracer: Optional[Tracer] = None
+_shared_handler: Optional[TracingCallbackHandler] = None
+_shared_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    The process-wide tracer, configured from the environment: CORTEX_TRACING=0 disables it
+    and CORTEX_TRACE_FILE names a JSONL file to append spans to.
+    """
+    global _shared_tracer
+    with _shared_lock:
+        if _shared_tracer is None:
+            _shared_tracer = Tracer(
+                enabled=os.getenv("CORTEX_TRACING", "1") != "0",
+                jsonl_path=os.getenv("CORTEX_TRACE_FILE") or None,
+            )
+        return _shared_tracer
+
+
+def get_tracing_handler() -> TracingCallbackHandler:
+    """The callback handler feeding the process-wide tracer."""
+    global _shared_handler
+    tracer = get_tracer()
+    with _shared_lock:
+        if _shared_handler is None:
+            _shared_handler = TracingCallbackHandler(tracer)
+        return _shared_handler